@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+A module for measuring the throughput of the redaction paths
+provided by `filtered_logger` on synthetic log lines and records
+shaped like `user_data.csv`.
+
+Running it prints lines/sec, ns/line and the peak memory allocated
+while redacting one line for every path, and compares them with the
+baseline saved by a previous `--save` run.
+"""
+import os
+import sys
+import json
+import random
+import string
+import sqlite3
+import timeit
+import tempfile
+import logging
+import argparse
+import itertools
+import tracemalloc
+import contextlib
+from typing import Callable, Dict, Iterator, List
+
+import filtered_logger
+from encrypt_password import hash_passwords
+from redact_logs import redact_file
+from filtered_logger import (PII_FIELDS, RedactingFilter, RedactingFormatter,
+                             RedactionPlanCache, filter_datum, format_row)
+
+COLUMNS = ("name", "email", "phone", "ssn", "password", "ip", "last_login",
+           "user_agent")
+BASELINE_FILE = ".benchmark_baseline.json"
+TRICKY_LINES = (
+    "username=bob;",
+    "msg=hello name=bob;",
+    "a=name=bob;email=x name=y;",
+    "name=bob phone=123;nickname=al;",
+    "=name=;password==;ssn",
+)
+DISTINCT_RECORDS = 1000
+
+
+def synthetic_line(n_fields: int, separator: str = ";") -> str:
+    """
+    Builds a `key=value` log line with the PII fields spread among
+    other fields.
+
+    Args:
+        n_fields (int): Number of fields in the line.
+        separator (str): Field separator.
+
+    Returns:
+        str: The log line.
+    """
+    rand = random.Random(n_fields)
+    pairs = []
+    for i in range(n_fields):
+        if i < len(PII_FIELDS):
+            key = PII_FIELDS[i]
+        else:
+            key = "field_{}".format(i)
+        value = ''.join(rand.choices(string.ascii_letters, k=12))
+        pairs.append('{}={}'.format(key, value))
+    rand.shuffle(pairs)
+    return '{}{}'.format(separator.join(pairs), separator)
+
+
+def synthetic_record(rand: random.Random) -> Dict[str, str]:
+    """
+    Builds a user record with the columns of `user_data.csv`.
+
+    Args:
+        rand (random.Random): Source of randomness.
+
+    Returns:
+        Dict[str, str]: The record.
+    """
+    def word(k):
+        return ''.join(rand.choices(string.ascii_lowercase, k=k))
+
+    return {
+        "name": "{} {}".format(word(6).title(), word(8).title()),
+        "email": "{}@{}.com".format(word(8), word(5)),
+        "phone": "({}) {}-{}".format(rand.randint(200, 999),
+                                     rand.randint(100, 999),
+                                     rand.randint(1000, 9999)),
+        "ssn": "{}-{}-{}".format(rand.randint(100, 999),
+                                 rand.randint(10, 99),
+                                 rand.randint(1000, 9999)),
+        "password": word(8),
+        "ip": ":".join("{:x}".format(rand.getrandbits(16))
+                       for _ in range(8)),
+        "last_login": "2019-11-14 06:{:02}:{:02}".format(
+            rand.randint(0, 59), rand.randint(0, 59)),
+        "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                      "AppleWebKit/537.36 (KHTML, like Gecko) "
+                      "Chrome/74.0.{}.157 Safari/537.36".format(
+                          rand.randint(1000, 9999)),
+    }
+
+
+def synthetic_records(rows: int) -> Iterator[Dict[str, str]]:
+    """
+    Yields `rows` records cycling over a fixed pool of distinct ones,
+    so that millions of rows can be produced in constant memory.
+
+    Args:
+        rows (int): Number of records.
+
+    Yields:
+        Dict[str, str]: The next record.
+    """
+    rand = random.Random(0)
+    pool = [synthetic_record(rand) for _ in range(DISTINCT_RECORDS)]
+    return itertools.islice(itertools.cycle(pool), rows)
+
+
+def row_message(record: Dict[str, str]) -> str:
+    """
+    Formats a record the way `main` used to before logging it.
+
+    Args:
+        record (Dict[str, str]): The record.
+
+    Returns:
+        str: The `key=value; ...;` log message.
+    """
+    return format_row(record, (), "")
+
+
+def make_record(record: Dict[str, str],
+                structured: bool) -> logging.LogRecord:
+    """
+    Wraps a user record into a LogRecord.
+
+    Args:
+        record (Dict[str, str]): The record.
+        structured (bool): Whether to attach the record as `row`
+            instead of formatting it into the message.
+
+    Returns:
+        logging.LogRecord: The log record.
+    """
+    msg = '' if structured else row_message(record)
+    log_record = logging.LogRecord("user_data", logging.INFO, None, None,
+                                   msg, None, None)
+    if structured:
+        log_record.row = record
+    return log_record
+
+
+def measure(func: Callable, items: List, rows: int) -> Dict[str, float]:
+    """
+    Measures a redaction path.
+
+    Args:
+        func (Callable): Function redacting one item.
+        items (List): Items to redact, cycled over.
+        rows (int): Number of calls to time.
+
+    Returns:
+        Dict[str, float]: lines/sec, ns/line and the peak number of
+        bytes allocated by one call.
+    """
+    cycle = itertools.islice(itertools.cycle(items), rows)
+    elapsed = timeit.timeit(lambda: func(next(cycle)), number=rows)
+    peaks = []
+    for item in items[:100]:
+        tracemalloc.start()
+        func(item)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return {
+        "lines_per_sec": rows / elapsed,
+        "ns_per_line": elapsed * 1e9 / rows,
+        "bytes_per_line": sum(peaks) / len(peaks),
+    }
+
+
+def measure_main(rows: int) -> Dict[str, float]:
+    """
+    Measures `filtered_logger.main` end to end against an in-memory
+    SQLite `users` table, with the log lines sent to /dev/null.
+
+    Args:
+        rows (int): Number of rows in the table.
+
+    Returns:
+        Dict[str, float]: lines/sec and ns/line.
+    """
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE users ({})".format(", ".join(COLUMNS)))
+    connection.executemany(
+        "INSERT INTO users VALUES ({})".format(", ".join("?" * len(COLUMNS))),
+        (tuple(r[c] for c in COLUMNS) for r in synthetic_records(rows)))
+    get_db = filtered_logger.get_db
+    filtered_logger.get_db = lambda: connection
+    logger = logging.getLogger("user_data")
+    try:
+        with open(os.devnull, 'w') as devnull, \
+                contextlib.redirect_stderr(devnull):
+            elapsed = timeit.timeit(lambda: filtered_logger.main(1000),
+                                    number=1)
+    finally:
+        filtered_logger.get_db = get_db
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+    return {
+        "lines_per_sec": rows / elapsed,
+        "ns_per_line": elapsed * 1e9 / rows,
+    }
+
+
+def run_suite(rows: int) -> Dict[str, Dict[str, float]]:
+    """
+    Measures every redaction path on `rows` synthetic records.
+
+    Args:
+        rows (int): Number of records per path.
+
+    Returns:
+        Dict[str, Dict[str, float]]: The measures of each path.
+    """
+    records = list(synthetic_records(DISTINCT_RECORDS))
+    messages = [row_message(r) for r in records]
+    cache = RedactionPlanCache()
+    formatters = {name: RedactingFormatter(PII_FIELDS, cache, name)
+                  for name in ("regex", "tokenizer")}
+    log_records = [make_record(r, False) for r in records]
+    row_records = [make_record(r, True) for r in records]
+    results = {
+        "filter_datum": measure(
+            lambda m: filter_datum(PII_FIELDS, "***", m, ";"),
+            messages, rows),
+        "format_row": measure(
+            lambda r: format_row(r, formatters["regex"].keys, "***"),
+            records, rows),
+    }
+    for name, formatter in formatters.items():
+        results["format[{}]".format(name)] = measure(
+            formatter.format, log_records, rows)
+    results["format[structured]"] = measure(
+        formatters["regex"].format, row_records, rows)
+    results["main"] = measure_main(rows)
+    return results
+
+
+def report(results: Dict[str, Dict[str, float]],
+           baseline: Dict[str, Dict[str, float]] = None,
+           tolerance: float = 0.2) -> bool:
+    """
+    Prints the measures next to the baseline ones.
+
+    Args:
+        results (Dict[str, Dict[str, float]]): The current measures.
+        baseline (Dict[str, Dict[str, float]]): The saved measures.
+        tolerance (float): Relative slowdown reported as a regression.
+
+    Returns:
+        bool: True if no path regressed.
+    """
+    baseline = baseline or {}
+    ok = True
+    print("{:<20} {:>12} {:>10} {:>10} {:>10}".format(
+        "path", "lines/sec", "ns/line", "B/line", "vs base"))
+    for path, res in results.items():
+        base = baseline.get(path)
+        change = ""
+        if base is not None:
+            ratio = res["ns_per_line"] / base["ns_per_line"]
+            change = "{:+.1f}%".format((ratio - 1) * 100)
+            if ratio > 1 + tolerance:
+                change += " REGRESSED"
+                ok = False
+        per_line = res.get("bytes_per_line")
+        print("{:<20} {:>12.0f} {:>10.0f} {:>10} {:>10}".format(
+            path, res["lines_per_sec"], res["ns_per_line"],
+            "-" if per_line is None else "{:.0f}".format(per_line),
+            change))
+    return ok
+
+
+def compare_fanout(handlers: List[int] = (1, 2, 4, 8),
+                   rows: int = 20000) -> None:
+    """
+    Prints the ns/line of a logger with a growing number of handlers,
+    each with its own `RedactingFormatter`, with and without a
+    `RedactingFilter` redacting the records once on the logger.
+
+    Args:
+        handlers (List[int]): Numbers of handlers.
+        rows (int): Number of records logged per measurement.
+    """
+    messages = [row_message(r) for r in synthetic_records(DISTINCT_RECORDS)]
+    print("{:>9} {:>16} {:>16}".format(
+        "handlers", "per-handler ns", "redact-once ns"))
+    for count in handlers:
+        timings = []
+        for redact_once in (False, True):
+            logger = logging.Logger("fanout")
+            if redact_once:
+                logger.addFilter(RedactingFilter(PII_FIELDS))
+            with open(os.devnull, 'w') as devnull:
+                for _ in range(count):
+                    handler = logging.StreamHandler(devnull)
+                    handler.setFormatter(RedactingFormatter(PII_FIELDS))
+                    logger.addHandler(handler)
+                cycle = itertools.cycle(messages)
+                elapsed = timeit.timeit(lambda: logger.info(next(cycle)),
+                                        number=rows)
+            timings.append(elapsed * 1e9 / rows)
+        print("{:>9} {:>16.0f} {:>16.0f}".format(count, *timings))
+
+
+def compare_hashing(workers: List[int] = (1, 2, 4, 8),
+                    count: int = 32) -> None:
+    """
+    Prints the bcrypt hashing rate of `hash_passwords` for growing
+    numbers of worker threads.
+
+    Args:
+        workers (List[int]): Numbers of threads.
+        count (int): Number of passwords hashed per measurement.
+    """
+    passwords = [record["password"] for record in synthetic_records(count)]
+    print("CPUs: {}".format(os.cpu_count()))
+    print("{:>8} {:>12} {:>8}".format("workers", "hashes/sec", "scaling"))
+    base = None
+    for count_workers in workers:
+        elapsed = timeit.timeit(
+            lambda: hash_passwords(passwords, count_workers), number=1)
+        rate = len(passwords) / elapsed
+        base = base or rate
+        print("{:>8} {:>12.1f} {:>7.2f}x".format(count_workers, rate,
+                                                 rate / base))
+
+
+def compare_redact_logs(workers: List[int] = (1, 2, 4, 8),
+                        rows: int = 200000,
+                        chunk_size: int = 1024 * 1024) -> None:
+    """
+    Prints the throughput of `redact_file` on a synthetic log file for
+    growing numbers of worker processes.
+
+    Args:
+        workers (List[int]): Numbers of processes.
+        rows (int): Number of lines of the log file.
+        chunk_size (int): Approximate chunk size in bytes.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        log_path = os.path.join(tmp_dir, "user_data.log")
+        with open(log_path, 'w') as f:
+            for record in synthetic_records(rows):
+                f.write("{}\n".format(row_message(record)))
+        size = os.path.getsize(log_path)
+        print("CPUs: {}".format(os.cpu_count()))
+        print("{:>8} {:>10} {:>12} {:>8}".format(
+            "workers", "MiB/sec", "lines/sec", "scaling"))
+        base = None
+        for count_workers in workers:
+            with open(os.devnull, 'wb') as output:
+                elapsed = timeit.timeit(
+                    lambda: redact_file(log_path, output,
+                                        workers=count_workers,
+                                        chunk_size=chunk_size),
+                    number=1)
+            rate = rows / elapsed
+            base = base or rate
+            print("{:>8} {:>10.1f} {:>12.0f} {:>7.2f}x".format(
+                count_workers, size / elapsed / 2 ** 20, rate, rate / base))
+
+
+def compare_engines(sizes: List[int] = (10, 25, 50, 100, 200),
+                    number: int = 2000) -> None:
+    """
+    Prints the lines/sec of every redaction engine for lines of
+    the given number of fields.
+
+    Args:
+        sizes (List[int]): Numbers of fields per line.
+        number (int): Number of lines redacted per measurement.
+    """
+    cache = RedactionPlanCache()
+    plans = {name: cache.get(PII_FIELDS, "***", ";", name)
+             for name in ("regex", "tokenizer")}
+    print("{:>7} {:>14} {:>14} {:>8}".format(
+        "fields", "regex (l/s)", "tokenizer (l/s)", "speedup"))
+    for size in sizes:
+        line = synthetic_line(size)
+        for sample in (line,) + TRICKY_LINES:
+            outputs = {plan.redact(sample) for plan in plans.values()}
+            assert len(outputs) == 1, "engines disagree on " + sample
+        rates = {}
+        for name, plan in plans.items():
+            elapsed = min(timeit.repeat(lambda: plan.redact(line),
+                                        number=number, repeat=3))
+            rates[name] = number / elapsed
+        print("{:>7} {:>14.0f} {:>14.0f} {:>7.2f}x".format(
+            size, rates["regex"], rates["tokenizer"],
+            rates["tokenizer"] / rates["regex"]))
+
+
+def main() -> None:
+    """
+    Parses the command-line arguments and runs the benchmarks.
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark the PII redaction paths.")
+    parser.add_argument('-n', '--rows', type=int, default=100000,
+                        help="number of records per path")
+    parser.add_argument('--engines', action='store_true',
+                        help="compare the engines on 10-200 field lines")
+    parser.add_argument('--fanout', action='store_true',
+                        help="compare redaction per handler and once")
+    parser.add_argument('--hashing', action='store_true',
+                        help="measure bcrypt hashing scaling over threads")
+    parser.add_argument('--redact-logs', action='store_true',
+                        help="measure redact_logs scaling over processes")
+    parser.add_argument('--save', action='store_true',
+                        help="store the results as the new baseline")
+    parser.add_argument('--baseline', default=BASELINE_FILE,
+                        help="baseline file")
+    args = parser.parse_args()
+    if args.engines:
+        compare_engines()
+        return
+    if args.fanout:
+        compare_fanout()
+        return
+    if args.hashing:
+        compare_hashing()
+        return
+    if args.redact_logs:
+        compare_redact_logs()
+        return
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+    results = run_suite(args.rows)
+    ok = report(results, baseline)
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,24 @@
 A module for encrypting passwords. It provides functions to
 hash passwords and validate hashed passwords.
 """
+import os
+import time
 import bcrypt
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, List, Tuple
+
+MIN_ROUNDS = 4
+MAX_ROUNDS = 31
+FLOOR_ROUNDS = 12
+cost = {'rounds': 12}
 
 
 def hash_password(password: str) -> bytes:
     """
-        Hashes a password using a random salt.
+        Hashes a password using a random salt and the current cost
+    factor.
 
     Args:
         password (str): The password to hash.
@@ -16,12 +28,248 @@ def hash_password(password: str) -> bytes:
     Returns:
         bytes: The hashed password.
     """
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    return bcrypt.hashpw(password.encode('utf-8'),
+                         bcrypt.gensalt(cost['rounds']))
+
+
+def calibrate_rounds(target_ms: float = 250.0, apply: bool = True,
+                     min_rounds: int = FLOOR_ROUNDS) -> int:
+    """
+        Picks the cost factor whose hashing time on this host is the
+    closest to a target latency. Each extra round doubles the work,
+    so the time of a cheap hash is measured and extrapolated, then the
+    chosen cost is measured once to correct the estimate. The cost
+    never goes below `min_rounds`, however fast the target.
+
+    Args:
+        target_ms (float): Target hashing time in milliseconds.
+        apply (bool): Whether new hashes should use the chosen cost.
+        min_rounds (int): Security floor of the cost factor.
+
+    Returns:
+        int: The chosen cost factor.
+    """
+    def measure(rounds):
+        salt = bcrypt.gensalt(rounds)
+        start = time.perf_counter()
+        bcrypt.hashpw(b'calibration', salt)
+        return (time.perf_counter() - start) * 1000
+
+    base_rounds = 8
+    base_ms = max(measure(base_rounds), 1e-3)
+    rounds = base_rounds
+    while rounds < MAX_ROUNDS and base_ms * 2 ** (rounds + 1 - base_rounds) \
+            <= target_ms * 1.41:
+        rounds += 1
+    rounds = max(MIN_ROUNDS, rounds)
+    elapsed = measure(rounds)
+    if elapsed > target_ms * 1.41 and rounds > MIN_ROUNDS:
+        rounds -= 1
+    elif elapsed * 2 <= target_ms * 1.41 and rounds < MAX_ROUNDS:
+        rounds += 1
+    rounds = max(min_rounds, rounds)
+    if apply:
+        cost['rounds'] = rounds
+    return rounds
+
+
+def needs_rehash(hashed_password: bytes) -> bool:
+    """
+        Checks if a hashed password uses a lower cost factor than the
+    current one. Stronger hashes are kept as they are.
+
+    Args:
+        hashed_password (bytes): The hashed password.
+
+    Returns:
+        bool: True if the password should be hashed again.
+    """
+    try:
+        return int(hashed_password.split(b'$')[2]) < cost['rounds']
+    except (IndexError, ValueError):
+        return True
 
 
-def is_valid(hashed_password: bytes, password: str) -> bool:
+def is_valid(hashed_password: bytes, password: str,
+             on_rehash: Callable[[bytes], None] = None) -> bool:
     """
         Checks if a hashed password was formed from the given password.
+    When it was and its cost factor is below target, the password is
+    hashed again with the current cost and handed to `on_rehash` so
+    that the caller can store the upgraded hash.
+
+    Args:
+        hashed_password (bytes): The hashed password.
+        password (str): The plain password to check.
+        on_rehash (Callable[[bytes], None]): Receives the new hash.
+
+    Returns:
+        bool: True if the password matches the hash, False otherwise.
+    """
+    valid = bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+    if valid and on_rehash is not None and needs_rehash(hashed_password):
+        on_rehash(hash_password(password))
+    return valid
+
+
+def hash_passwords(passwords: Iterable[str],
+                   workers: int = None) -> List[bytes]:
+    """
+        Hashes many passwords concurrently. bcrypt releases the GIL
+    while hashing, so a thread pool spreads the work over the cores.
+
+    Args:
+        passwords (Iterable[str]): The passwords to hash.
+        workers (int): Number of threads, the CPU count by default.
+
+    Returns:
+        List[bytes]: The hashed passwords, in the input order.
+    """
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        return list(executor.map(hash_password, passwords))
+
+
+def verify_many(pairs: Iterable[Tuple[bytes, str]],
+                workers: int = None) -> List[bool]:
+    """
+        Checks many (hashed password, password) pairs concurrently.
+
+    Args:
+        pairs (Iterable[Tuple[bytes, str]]): The hashed passwords and
+            the plain passwords to check against them.
+        workers (int): Number of threads, the CPU count by default.
+
+    Returns:
+        List[bool]: Whether each password matches, in the input order.
+    """
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        return list(executor.map(lambda pair: is_valid(*pair), pairs))
+
+
+class HashingExecutor:
+    """
+    A dedicated, bounded thread pool running bcrypt work for asyncio
+    code, with metrics on the work waiting for a thread.
+    """
+
+    def __init__(self, workers: int = None):
+        """
+        Initializes the pool and its metrics.
+
+        Args:
+            workers (int): Number of threads, the CPU count by default.
+        """
+        self.workers = workers or os.cpu_count()
+        self.pending = 0
+        self.started = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                            thread_name_prefix='bcrypt')
+
+    def _timed(self, func: Callable, args: tuple, queued_at: float):
+        """
+        Runs a job on a pool thread, recording how long it waited.
+
+        Args:
+            func (Callable): The blocking function.
+            args (tuple): Its arguments.
+            queued_at (float): Monotonic time the job was submitted.
+
+        Returns:
+            The function's result.
+        """
+        wait = time.monotonic() - queued_at
+        with self._lock:
+            self.pending -= 1
+            self.started += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.completed += 1
+
+    def _discard_cancelled(self, future: Future) -> None:
+        """
+        Stops counting a job as pending when it was cancelled before a
+        thread picked it up, e.g. by `asyncio.wait_for` timing out.
+
+        Args:
+            future (Future): The future of the job.
+        """
+        if future.cancelled():
+            with self._lock:
+                self.pending -= 1
+
+    async def run(self, func: Callable, *args):
+        """
+        Runs a function on the pool without blocking the event loop.
+
+        Args:
+            func (Callable): The blocking function.
+            args: Its arguments.
+
+        Returns:
+            The function's result.
+        """
+        with self._lock:
+            self.pending += 1
+        try:
+            future = self._executor.submit(self._timed, func, args,
+                                           time.monotonic())
+        except BaseException:
+            with self._lock:
+                self.pending -= 1
+            raise
+        future.add_done_callback(self._discard_cancelled)
+        return await asyncio.wrap_future(future)
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Returns the number of jobs waiting for a thread.
+        """
+        return self.pending
+
+    @property
+    def mean_wait(self) -> float:
+        """
+        Returns the mean time in seconds a job waited for a thread.
+        """
+        with self._lock:
+            total_wait, started = self.total_wait, self.started
+        return total_wait / started if started else 0.0
+
+    def shutdown(self) -> None:
+        """
+        Waits for the running jobs and stops the pool.
+        """
+        self._executor.shutdown(wait=True)
+
+
+hashing_executor = HashingExecutor()
+
+
+async def hash_password_async(password: str) -> bytes:
+    """
+        Hashes a password on `hashing_executor`.
+
+    Args:
+        password (str): The password to hash.
+
+    Returns:
+        bytes: The hashed password.
+    """
+    return await hashing_executor.run(hash_password, password)
+
+
+async def is_valid_async(hashed_password: bytes, password: str) -> bool:
+    """
+        Checks a password against its hash on `hashing_executor`.
 
     Args:
         hashed_password (bytes): The hashed password.
@@ -30,4 +278,4 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
     Returns:
         bool: True if the password matches the hash, False otherwise.
     """
-    return bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+    return await hashing_executor.run(is_valid, hashed_password, password)
@@ -6,16 +6,436 @@ create loggers, and connect to a database.
 """
 import os
 import re
+import sys
+import hmac
+import json
+import hashlib
+import time
+import queue
+import threading
 import logging
+import logging.handlers
 import mysql.connector
-from typing import List
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from typing import Callable, Iterator, List, Mapping, Tuple
 
 patterns = {
     'extract': lambda x, y: r'(?P<field>{})=[^{}]*'.format(
         '|'.join(x), y),
     'replace': lambda x: r'\g<field>={}'.format(x),
+    'extract_value': lambda x, y: r'(?P<field>{})=(?P<value>[^{}]*)'.format(
+        '|'.join(x), y),
+}
+
+
+class Pseudonymizer:
+    """
+    A mask replacing a value by a stable token, the truncated
+    HMAC-SHA256 of the value under a secret key, so that redacted logs
+    can still be joined on it. Tokens of recently seen values are
+    memoized in a bounded LRU cache.
+    """
+
+    def __init__(self, key: bytes = None, maxsize: int = 65536,
+                 length: int = 16):
+        """
+        Initializes the mask with an empty memo.
+
+        Args:
+            key (bytes): HMAC key, `PERSONAL_DATA_PSEUDONYM_KEY` read
+                when the first token is computed by default; without
+                one a random key is used, with a warning, and tokens
+                are only stable within the process.
+            maxsize (int): Maximum number of memoized tokens.
+            length (int): Number of hexadecimal digits of a token.
+        """
+        self.key = key
+        self.maxsize = maxsize
+        self.length = length
+        self.hits = 0
+        self.misses = 0
+        self._tokens = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_lock = threading.Lock()
+
+    def _load_key(self) -> bytes:
+        """
+        Reads the HMAC key from `PERSONAL_DATA_PSEUDONYM_KEY` on first
+        use, so that it can be set after the module is imported.
+
+        Returns:
+            bytes: The HMAC key.
+        """
+        missing = False
+        with self._key_lock:
+            if self.key is None:
+                env_key = os.getenv("PERSONAL_DATA_PSEUDONYM_KEY")
+                missing = not env_key
+                self.key = os.urandom(32) if missing \
+                    else env_key.encode('utf-8')
+            key = self.key
+        if missing:
+            logging.warning("PERSONAL_DATA_PSEUDONYM_KEY is not set: "
+                            "pseudonyms will not match across runs")
+        return key
+
+    def __call__(self, value: str, redaction: str) -> str:
+        """
+        Returns the token of a value.
+
+        Args:
+            value (str): Value to pseudonymize.
+            redaction (str): Redaction string, unused.
+
+        Returns:
+            str: The token.
+        """
+        key = self.key if self.key is not None else self._load_key()
+        with self._lock:
+            token = self._tokens.get(value)
+            if token is not None:
+                self.hits += 1
+                self._tokens.move_to_end(value)
+                return token
+            self.misses += 1
+            token = hmac.new(key, value.encode('utf-8'),
+                             hashlib.sha256).hexdigest()[:self.length]
+            self._tokens[value] = token
+            if len(self._tokens) > self.maxsize:
+                self._tokens.popitem(last=False)
+            return token
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        Returns the share of tokens served from the memo.
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+pseudonymizer = Pseudonymizer()
+masks = {
+    'full': lambda value, redaction: redaction,
+    'last4': lambda value, redaction: redaction + value[-4:]
+    if len(value) > 4 else redaction,
+    'domain': lambda value, redaction: redaction + value[value.rfind('@'):]
+    if '@' in value else redaction,
+    'pseudonym': pseudonymizer,
 }
 PII_FIELDS = ("name", "email", "phone", "ssn", "password")
+USER_FIELDS = "name,email,phone,ssn,password,ip,last_login,user_agent"
+SUPPORT_POLICIES = {
+    "name": "full",
+    "email": "domain",
+    "phone": "last4",
+    "ssn": "last4",
+    "password": "full",
+}
+PSEUDONYM_POLICIES = {
+    "name": "pseudonym",
+    "email": "pseudonym",
+    "phone": "pseudonym",
+    "ssn": "pseudonym",
+    "password": "full",
+}
+
+
+class RedactionPlan:
+    """
+    A redaction rule compiled once for a given set of fields,
+    separator and redaction string.
+    """
+
+    def __init__(self, fields: List[str], redaction: str, separator: str):
+        """
+        Compiles the extraction pattern and replacement template.
+
+        Args:
+            fields (List[str]): List of fields to redact.
+            redaction (str): Redaction string.
+            separator (str): Field separator.
+
+        Raises:
+            re.error: If the fields do not form a valid pattern.
+        """
+        self.fields = tuple(fields)
+        self.redaction = redaction
+        self.separator = separator
+        self.pattern = re.compile(patterns['extract'](fields, separator))
+        self.replacement = patterns['replace'](redaction)
+
+    def redact(self, message: str) -> str:
+        """
+        Redacts the plan's fields in a log line.
+
+        Args:
+            message (str): Log message.
+
+        Returns:
+            str: Redacted log message.
+        """
+        return self.pattern.sub(self.replacement, message)
+
+
+class RedactionPlanCache:
+    """
+    A bounded LRU cache of redaction plans keyed by
+    (fields, separator, redaction, engine).
+    """
+
+    def __init__(self, maxsize: int = 32):
+        """
+        Initializes an empty cache.
+
+        Args:
+            maxsize (int): Maximum number of plans kept.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._plans = OrderedDict()
+
+    def get(self, fields: List[str], redaction: str, separator: str,
+            engine: str = 'regex') -> RedactionPlan:
+        """
+        Retrieves the plan for the given arguments, compiling it
+        on a miss and evicting the least recently used plan if full.
+
+        Args:
+            fields (List[str]): List of fields to redact, or mapping
+                of fields to policies for the `policy` engine.
+            redaction (str): Redaction string.
+            separator (str): Field separator.
+            engine (str): Name of the redaction engine in `engines`.
+
+        Returns:
+            RedactionPlan: The compiled plan.
+        """
+        if isinstance(fields, Mapping):
+            key = (tuple(fields.items()), separator, redaction, engine)
+        else:
+            key = (tuple(fields), separator, redaction, engine)
+        plan = self._plans.get(key)
+        if plan is not None:
+            self.hits += 1
+            self._plans.move_to_end(key)
+            return plan
+        self.misses += 1
+        plan = engines[engine](fields, redaction, separator)
+        self._plans[key] = plan
+        if len(self._plans) > self.maxsize:
+            self._plans.popitem(last=False)
+        return plan
+
+    def stats(self) -> Tuple[int, int, int]:
+        """
+        Returns the cache counters.
+
+        Returns:
+            Tuple[int, int, int]: The hits, misses and current size.
+        """
+        return self.hits, self.misses, len(self._plans)
+
+    def clear(self) -> None:
+        """
+        Drops every cached plan and resets the counters.
+        """
+        self._plans.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+class TokenRedactionPlan:
+    """
+    A regex-free redaction rule that walks separator-delimited
+    segments once and masks the values of known keys.
+
+    Like the unanchored pattern of `RedactionPlan`, a key matches
+    wherever it ends right before an `=`, including inside a longer
+    word (`username=`) or after other text (`msg=hi name=`), and the
+    value runs to the separator, so the output is identical.
+
+    The pattern treats the separator as a set of characters, so only
+    single-character separators split lines the same way.
+    """
+
+    def __init__(self, fields: List[str], redaction: str, separator: str):
+        """
+        Builds the set of keys to redact.
+
+        Args:
+            fields (List[str]): List of fields to redact.
+            redaction (str): Redaction string.
+            separator (str): Field separator, a single character.
+
+        Raises:
+            ValueError: If the separator is not a single character.
+        """
+        if len(separator) != 1:
+            raise ValueError(
+                "The tokenizer engine needs a single-character separator")
+        self.fields = tuple(fields)
+        self.redaction = redaction
+        self.separator = separator
+        self.keys = tuple(set(fields))
+
+    def _match(self, segment: str) -> int:
+        """
+        Finds the end of the first key followed by `=` in a segment.
+
+        Args:
+            segment (str): Separator-delimited part of a log line.
+
+        Returns:
+            int: The index of the `=` following the key, or -1.
+        """
+        keys = self.keys
+        equal = segment.find('=')
+        while equal >= 0:
+            if segment.endswith(keys, 0, equal):
+                return equal
+            equal = segment.find('=', equal + 1)
+        return -1
+
+    def redact(self, message: str) -> str:
+        """
+        Redacts the plan's fields in a log line.
+
+        Args:
+            message (str): Log message.
+
+        Returns:
+            str: Redacted log message.
+        """
+        match, redaction = self._match, self.redaction
+        out = []
+        for segment in message.split(self.separator):
+            equal = match(segment)
+            if equal < 0:
+                out.append(segment)
+            else:
+                out.append(segment[:equal + 1] + redaction)
+        return self.separator.join(out)
+
+
+class PolicyRedactionPlan:
+    """
+    A redaction rule applying a masking policy of `masks` per field,
+    e.g. keeping the last 4 digits of a phone number. All the fields
+    are matched by a single compiled pattern and each match is masked
+    by the policy of its field, so the line is scanned only once.
+    """
+
+    def __init__(self, fields: Mapping, redaction: str, separator: str):
+        """
+        Compiles the extraction pattern and resolves the policies.
+
+        Args:
+            fields (Mapping): Fields to redact mapped to the name of
+                their policy in `masks`; a plain list of fields masks
+                them fully.
+            redaction (str): Redaction string.
+            separator (str): Field separator.
+
+        Raises:
+            KeyError: If a policy is unknown.
+            re.error: If the fields do not form a valid pattern.
+        """
+        if not isinstance(fields, Mapping):
+            fields = dict.fromkeys(fields, 'full')
+        self.fields = tuple(fields.items())
+        self.redaction = redaction
+        self.separator = separator
+        self.policies = {field: masks[policy]
+                         for field, policy in fields.items()}
+        self.pattern = re.compile(
+            patterns['extract_value'](fields, separator))
+
+    def mask(self, match: re.Match) -> str:
+        """
+        Masks the value of a matched field.
+
+        Args:
+            match (re.Match): Match of a `field=value` pair.
+
+        Returns:
+            str: The masked pair.
+        """
+        field = match.group('field')
+        return '{}={}'.format(field, self.policies[field](
+            match.group('value'), self.redaction))
+
+    def redact(self, message: str) -> str:
+        """
+        Redacts the plan's fields in a log line.
+
+        Args:
+            message (str): Log message.
+
+        Returns:
+            str: Redacted log message.
+        """
+        return self.pattern.sub(self.mask, message)
+
+
+engines = {
+    'regex': RedactionPlan,
+    'tokenizer': TokenRedactionPlan,
+    'policy': PolicyRedactionPlan,
+}
+plan_cache = RedactionPlanCache()
+
+
+def redaction_identity(fields: List[str], redaction: str,
+                       separator: str) -> Tuple:
+    """
+    Returns what determines the output of a redaction: the policy of
+    each field, the redaction string and the separator. Two plans
+    with the same identity redact a line the same way whatever their
+    engine.
+
+    Args:
+        fields (List[str]): List of fields to redact, or mapping of
+            fields to their policy in `masks`.
+        redaction (str): Redaction string.
+        separator (str): Field separator.
+
+    Returns:
+        Tuple: The identity of the redaction.
+    """
+    if isinstance(fields, Mapping):
+        policies = frozenset(fields.items())
+    else:
+        policies = frozenset((field, 'full') for field in fields)
+    return policies, redaction, separator
+
+
+def select_engine(fields: List[str], engine: str = None) -> str:
+    """
+    Returns the redaction engine for a set of fields: `policy` when
+    the fields are mapped to policies, `regex` otherwise.
+
+    Args:
+        fields (List[str]): List of fields to redact, or mapping of
+            fields to their policy in `masks`.
+        engine (str): Requested engine, None for the default.
+
+    Returns:
+        str: Name of the engine in `engines`.
+
+    Raises:
+        ValueError: If an engine other than `policy` is requested
+            for a mapping of policies.
+    """
+    if not isinstance(fields, Mapping):
+        return 'regex' if engine is None else engine
+    if engine not in (None, 'policy'):
+        raise ValueError(
+            "Engine {} cannot apply per-field policies".format(engine))
+    return 'policy'
 
 
 def filter_datum(fields: List[str], redaction: str, message: str,
@@ -32,15 +452,41 @@ def filter_datum(fields: List[str], redaction: str, message: str,
     Returns:
         str: Redacted log message.
     """
-    extract, replace = (patterns["extract"], patterns["replace"])
     try:
-        return re.sub(extract(fields, separator), replace(redaction),
-                      message)
+        return plan_cache.get(fields, redaction, separator).redact(message)
     except re.error as e:
         logging.error("Regex error: %s", e)
         return message
 
 
+def format_row(row: Mapping, fields: List[str], redaction: str) -> str:
+    """
+    Builds a `key=value; ...;` log line from a row, masking the
+    values of the specified fields by key instead of by pattern.
+
+    Args:
+        row (Mapping): Column names mapped to their values.
+        fields (List[str]): List of fields to redact, or mapping of
+            fields to their policy in `masks`.
+        redaction (str): Redaction string.
+
+    Returns:
+        str: Redacted log message.
+    """
+    if isinstance(fields, Mapping):
+        record = map(
+            lambda x: '{}={}'.format(x[0], masks[fields[x[0]]](
+                str(x[1]), redaction) if x[0] in fields else x[1]),
+            row.items(),
+        )
+        return '{};'.format('; '.join(record))
+    record = map(
+        lambda x: '{}={}'.format(x[0], redaction if x[0] in fields else x[1]),
+        row.items(),
+    )
+    return '{};'.format('; '.join(record))
+
+
 def get_logger() -> logging.Logger:
     """
     Creates a new logger for user data.
@@ -57,6 +503,128 @@ def get_logger() -> logging.Logger:
     return logger
 
 
+class DrainingQueueListener(logging.handlers.QueueListener):
+    """
+    A queue listener whose stop sentinel waits for a free slot of a
+    bounded queue instead of failing when the queue is full.
+    """
+
+    def enqueue_sentinel(self) -> None:
+        """
+        Enqueues the stop sentinel behind every pending record.
+        """
+        self.queue.put(self._sentinel)
+
+
+class OverflowQueueHandler(logging.handlers.QueueHandler):
+    """
+    A queue handler for a bounded queue which applies an overflow
+    policy when the queue is full:
+
+    - `block`: wait for the listener to free a slot.
+    - `drop-oldest`: discard the oldest queued record.
+    - `count-and-drop`: discard the new record.
+
+    Records are not formatted on the caller's thread, the listener's
+    handlers redact and write them. Closing the handler stops the
+    listener once every queued record was handled.
+    """
+    OVERFLOW_POLICIES = ('block', 'drop-oldest', 'count-and-drop')
+
+    def __init__(self, maxsize: int = 10000, overflow: str = 'block'):
+        """
+        Initializes the handler with an empty queue.
+
+        Args:
+            maxsize (int): Maximum number of queued records.
+            overflow (str): Policy applied when the queue is full.
+
+        Raises:
+            ValueError: If the overflow policy is unknown.
+        """
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError("Unknown overflow policy: {}".format(overflow))
+        super(OverflowQueueHandler, self).__init__(queue.Queue(maxsize))
+        self.overflow = overflow
+        self.dropped = 0
+        self.listener = None
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Merges the record's arguments into its message, leaving the
+        formatting and redaction to the listener's handlers.
+
+        Args:
+            record (logging.LogRecord): Log record to enqueue.
+
+        Returns:
+            logging.LogRecord: The record to enqueue.
+        """
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """
+        Enqueues a record according to the overflow policy.
+
+        Args:
+            record (logging.LogRecord): Log record to enqueue.
+        """
+        if self.overflow == 'block':
+            self.queue.put(record)
+            return
+        while True:
+            try:
+                self.queue.put_nowait(record)
+                return
+            except queue.Full:
+                self.dropped += 1
+                if self.overflow == 'count-and-drop':
+                    return
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+
+    def close(self) -> None:
+        """
+        Flushes the queue through the listener and stops it.
+        """
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        super(OverflowQueueHandler, self).close()
+
+
+def get_async_logger(maxsize: int = 10000,
+                     overflow: str = 'block') -> logging.Logger:
+    """
+    Creates a new logger for user data whose records are redacted
+    and written on a background thread.
+
+    Args:
+        maxsize (int): Maximum number of queued records.
+        overflow (str): Policy applied when the queue is full, one of
+            `OverflowQueueHandler.OVERFLOW_POLICIES`.
+
+    Returns:
+        logging.Logger: Configured logger.
+    """
+    logger = logging.getLogger("user_data")
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(RedactingFormatter(PII_FIELDS))
+    queue_handler = OverflowQueueHandler(maxsize, overflow)
+    queue_handler.listener = DrainingQueueListener(
+        queue_handler.queue, stream_handler)
+    queue_handler.listener.start()
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    logger.addHandler(queue_handler)
+    return logger
+
+
 def get_db() -> mysql.connector.connection.MySQLConnection:
     """
     Creates a connector to a MySQL database.
@@ -82,30 +650,544 @@ def get_db() -> mysql.connector.connection.MySQLConnection:
         return None
 
 
-def main():
+class ConnectionPool:
+    """
+    A bounded pool of reusable database connections.
+
+    Connections are created on demand by `connect` (`get_db` by
+    default, so the `PERSONAL_DATA_DB_*` environment variables apply),
+    checked with a `SELECT 1` when borrowed and closed once they stay
+    idle longer than `max_idle` seconds. Any DB-API connection factory
+    can be used, e.g. `sqlite3.connect` for local runs.
+    """
+
+    def __init__(self, size: int = 5, max_idle: float = 300.0,
+                 connect: Callable = None):
+        """
+        Initializes an empty pool.
+
+        Args:
+            size (int): Maximum number of open connections.
+            max_idle (float): Seconds after which an idle connection
+                is closed instead of reused.
+            connect (Callable): Factory returning a new connection, or
+                None when the connection fails.
+        """
+        self.size = size
+        self.max_idle = max_idle
+        self.connect = get_db if connect is None else connect
+        self.created = 0
+        self.recycled = 0
+        self._idle = []
+        self._cond = threading.Condition()
+
+    @staticmethod
+    def is_healthy(connection) -> bool:
+        """
+        Checks that a connection can still run a query.
+
+        Args:
+            connection: DB-API connection.
+
+        Returns:
+            bool: True if the connection answered.
+        """
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, connection) -> None:
+        """
+        Closes a connection and frees its slot for a waiting thread.
+
+        Args:
+            connection: DB-API connection.
+        """
+        with self._cond:
+            self.created -= 1
+            self.recycled += 1
+            self._cond.notify()
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def acquire(self, timeout: float = None):
+        """
+        Borrows a connection, reusing an idle healthy one first and
+        opening a new one while the pool is not full.
+
+        Args:
+            timeout (float): Seconds to wait for a connection to be
+                released when the pool is full, None to wait forever.
+
+        Returns:
+            The connection, or None if none could be obtained.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._cond:
+                while not self._idle and self.created >= self.size:
+                    remaining = None
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            logging.error(
+                                "No database connection released in time")
+                            return None
+                    self._cond.wait(remaining)
+                if self._idle:
+                    connection, released = self._idle.pop()
+                else:
+                    connection, released = None, None
+                    self.created += 1
+            if connection is None:
+                try:
+                    connection = self.connect()
+                finally:
+                    if connection is None:
+                        with self._cond:
+                            self.created -= 1
+                            self._cond.notify()
+                return connection
+            if time.monotonic() - released > self.max_idle or \
+                    not self.is_healthy(connection):
+                self._discard(connection)
+                continue
+            return connection
+
+    def release(self, connection) -> None:
+        """
+        Returns a borrowed connection to the pool.
+
+        Args:
+            connection: DB-API connection obtained from `acquire`.
+        """
+        with self._cond:
+            self._idle.append((connection, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: float = None):
+        """
+        Borrows a connection for the duration of a `with` block.
+
+        Args:
+            timeout (float): Seconds to wait for a free connection.
+
+        Yields:
+            The connection, or None if none could be obtained.
+        """
+        connection = self.acquire(timeout)
+        try:
+            yield connection
+        finally:
+            if connection is not None:
+                self.release(connection)
+
+    def close(self) -> None:
+        """
+        Closes every idle connection.
+        """
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._discard(connection)
+
+
+class ExportProgress:
+    """
+    Progress counters of a table export.
+    """
+
+    def __init__(self):
+        """
+        Starts the export clock with no rows processed.
+        """
+        self.rows = 0
+        self.batches = 0
+        self.started = time.monotonic()
+
+    def update(self, rows: int) -> None:
+        """
+        Records a processed batch.
+
+        Args:
+            rows (int): Number of rows in the batch.
+        """
+        self.rows += rows
+        self.batches += 1
+
+    @property
+    def elapsed(self) -> float:
+        """
+        Returns the seconds elapsed since the export started.
+        """
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_sec(self) -> float:
+        """
+        Returns the average export rate.
+        """
+        elapsed = self.elapsed
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+
+def fetch_batches(cursor, batch_size: int) -> Iterator[List[tuple]]:
+    """
+    Yields the remaining rows of an executed cursor in batches, so
+    that at most one batch is held in memory at a time.
+
+    Args:
+        cursor: DB-API cursor on which a query was executed.
+        batch_size (int): Number of rows per batch; 0 or less fetches
+            every row at once.
+
+    Yields:
+        List[tuple]: The next batch of rows.
+    """
+    if batch_size <= 0:
+        yield cursor.fetchall()
+        return
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+class Watermark:
+    """
+    The high-water mark of an incremental export: the greatest
+    `(last_login, email)` pair exported so far, persisted in a JSON
+    file after every batch so that an interrupted export resumes
+    where it stopped.
+
+    Rows without a `last_login` sort first and cannot be ordered
+    against the mark: the first export, run before any mark is
+    stored, includes them, and later ones only pick up rows with a
+    `last_login` past the mark.
+    """
+
+    def __init__(self, path: str):
+        """
+        Loads the mark stored at `path`, if any.
+
+        Args:
+            path (str): Path of the watermark file.
+        """
+        self.path = path
+        self.last_login = None
+        self.email = None
+        self.started = os.path.exists(path)
+        if self.started:
+            with open(path, 'r') as f:
+                mark = json.load(f)
+            if mark.get('last_login') not in (None, 'None'):
+                self.last_login = mark['last_login']
+                self.email = mark.get('email')
+
+    def update(self, last_login, email: str) -> None:
+        """
+        Moves the mark to an exported row and persists it. A row
+        without a `last_login` leaves the mark unchanged, but the mark
+        is still persisted to record that the first export started.
+
+        Args:
+            last_login: The `last_login` of the row.
+            email (str): The `email` of the row.
+        """
+        if last_login is not None:
+            self.last_login = str(last_login)
+            self.email = email
+        self.started = True
+        tmp_path = "{}.tmp".format(self.path)
+        with open(tmp_path, 'w') as f:
+            json.dump({'last_login': self.last_login, 'email': self.email},
+                      f)
+        os.replace(tmp_path, self.path)
+
+
+def placeholder(connection) -> str:
+    """
+    Returns the query parameter placeholder of a DB-API connection,
+    based on the `paramstyle` of its driver module.
+
+    Args:
+        connection: DB-API connection.
+
+    Returns:
+        str: `?` for qmark drivers such as sqlite3, `%s` otherwise.
+    """
+    module = type(connection).__module__
+    while module:
+        paramstyle = getattr(sys.modules.get(module), 'paramstyle', None)
+        if paramstyle is not None:
+            return '?' if paramstyle == 'qmark' else '%s'
+        module = module.rpartition('.')[0]
+    return '%s'
+
+
+def log_rows(logger: logging.Logger, columns: List[str],
+             rows: List[tuple]) -> None:
+    """
+    Logs user rows as structured records.
+
+    Args:
+        logger (logging.Logger): Logger handling the records.
+        columns (List[str]): Column names of the rows.
+        rows (List[tuple]): Rows to log.
+    """
+    for row in rows:
+        args = ("user_data", logging.INFO, None, None, '', None, None)
+        log_record = logging.LogRecord(*args)
+        log_record.row = dict(zip(columns, row))
+        logger.handle(log_record)
+
+
+def partition_bounds(connection, key: str, partitions: int) -> List:
+    """
+    Splits the `users` table into ranges of about the same number of
+    rows on a key column.
+
+    Args:
+        connection: DB-API connection.
+        key (str): Column the ranges are defined on.
+        partitions (int): Number of ranges wanted.
+
+    Returns:
+        List: The increasing inner bounds of the ranges.
+    """
+    bounds = []
+    with closing(connection.cursor()) as cursor:
+        cursor.execute("SELECT COUNT(*) FROM users;")
+        count = cursor.fetchall()[0][0]
+        for i in range(1, partitions):
+            cursor.execute(
+                "SELECT {0} FROM users ORDER BY {0} LIMIT 1 OFFSET {1};"
+                .format(key, i * count // partitions))
+            rows = cursor.fetchall()
+            if rows and rows[0][0] is not None and \
+                    (not bounds or rows[0][0] > bounds[-1]):
+                bounds.append(rows[0][0])
+    return bounds
+
+
+def put_batch(batches: queue.Queue, item, stop: threading.Event) -> bool:
+    """
+    Puts an item on a bounded queue, waiting for room unless the
+    consumer has stopped.
+
+    Args:
+        batches (queue.Queue): Queue read by the consumer.
+        item: Item to put.
+        stop (threading.Event): Set when the consumer has stopped.
+
+    Returns:
+        bool: True if the item was put.
+    """
+    while not stop.is_set():
+        try:
+            batches.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def fetch_range(connect: Callable, key: str, low, high, batch_size: int,
+                batches: queue.Queue, stop: threading.Event) -> None:
+    """
+    Reads the users whose key lies in `[low, high)` on a connection of
+    its own, ordered by key. A missing bound leaves the range open, and
+    the rows with a NULL key belong to the first range.
+
+    The rows are streamed to `batches` one batch at a time, followed
+    by None once the range is exhausted. A failure is put on the queue
+    as the exception raised, and `stop` ends the read early.
+
+    Args:
+        connect (Callable): Factory returning a new connection.
+        key (str): Column the range is defined on.
+        low: Inclusive lower bound, or None.
+        high: Exclusive upper bound, or None.
+        batch_size (int): Number of rows fetched per batch.
+        batches (queue.Queue): Bounded queue receiving the batches.
+        stop (threading.Event): Set when the consumer has stopped.
+    """
+    try:
+        connection = connect()
+        if not connection:
+            raise ConnectionError("No database connection available")
+        try:
+            mark = placeholder(connection)
+            conditions, params = [], []
+            if low is not None:
+                conditions.append("{} >= {}".format(key, mark))
+                params.append(low)
+            if high is not None:
+                upper = "{} < {}".format(key, mark)
+                if low is None:
+                    upper = "({} IS NULL OR {})".format(key, upper)
+                conditions.append(upper)
+                params.append(high)
+            where = " WHERE {}".format(" AND ".join(conditions)) \
+                if conditions else ""
+            query = "SELECT {} FROM users{} ORDER BY {};".format(
+                USER_FIELDS, where, key)
+            with closing(connection.cursor()) as cursor:
+                cursor.execute(query, tuple(params))
+                for rows in fetch_batches(cursor, batch_size):
+                    if not put_batch(batches, rows, stop):
+                        return
+        finally:
+            connection.close()
+    except Exception as err:
+        put_batch(batches, err, stop)
+        return
+    put_batch(batches, None, stop)
+
+
+def export_parallel(partitions: int = 4, key: str = "email",
+                    workers: int = None, batch_size: int = 1000,
+                    connect: Callable = None) -> ExportProgress:
+    """
+    Logs the information about user records in a table, reading
+    ranges of the `key` column concurrently on a thread pool, each on
+    its own connection. The ranges are logged in key order as they
+    complete, so the output is the same as an export ordered by key.
+
+    At most `workers` ranges are read at a time and each of them
+    streams its rows through a queue of two batches, so at most
+    `2 * workers` batches are held in memory whatever the table size.
+
+    Args:
+        partitions (int): Number of key ranges.
+        key (str): Column the ranges are defined on.
+        workers (int): Number of threads, one per range by default.
+        batch_size (int): Number of rows fetched per batch.
+        connect (Callable): Factory returning a new connection,
+            `get_db` by default.
+
+    Returns:
+        ExportProgress: The export counters, or None on failure.
+    """
+    connect = get_db if connect is None else connect
+    columns = USER_FIELDS.split(',')
+    info_logger = get_logger()
+    connection = connect()
+    if not connection:
+        logging.error("No database connection available")
+        return None
+    try:
+        bounds = partition_bounds(connection, key, partitions)
+    except mysql.connector.Error as err:
+        logging.error("Database query error: %s", err)
+        return None
+    finally:
+        connection.close()
+    ranges = list(zip([None] + bounds, bounds + [None]))
+    workers = workers or len(ranges)
+    progress = ExportProgress()
+    stop = threading.Event()
+    pending = []
+    submitted = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            while submitted < len(ranges) or pending:
+                while submitted < len(ranges) and len(pending) < workers:
+                    low, high = ranges[submitted]
+                    batches = queue.Queue(maxsize=2)
+                    executor.submit(fetch_range, connect, key, low, high,
+                                    batch_size, batches, stop)
+                    pending.append(batches)
+                    submitted += 1
+                batches = pending.pop(0)
+                rows = batches.get()
+                while rows is not None:
+                    if isinstance(rows, Exception):
+                        raise rows
+                    log_rows(info_logger, columns, rows)
+                    progress.update(len(rows))
+                    logging.debug("Exported %d rows (%.0f rows/sec)",
+                                  progress.rows, progress.rows_per_sec)
+                    rows = batches.get()
+        except ConnectionError as err:
+            logging.error("%s", err)
+            return None
+        except mysql.connector.Error as err:
+            logging.error("Database query error: %s", err)
+            return None
+        finally:
+            stop.set()
+    return progress
+
+
+def main(batch_size: int = None, watermark: str = None) -> ExportProgress:
     """
     Logs the information about user records in a table.
+
+    Rows are streamed from an unbuffered cursor in batches of
+    `batch_size` rows (`PERSONAL_DATA_BATCH_SIZE`, 0 by default for
+    a single fetch), and the progress is reported after each batch.
+
+    With a `watermark` file (`PERSONAL_DATA_WATERMARK`), only the
+    rows past the stored `(last_login, email)` mark are exported, in
+    that order, and the mark is advanced after each batch. Rows with
+    a NULL `last_login` are only exported by the first run, before
+    any mark is stored.
+
+    Args:
+        batch_size (int): Number of rows fetched per batch.
+        watermark (str): Path of the watermark file of an incremental
+            export.
+
+    Returns:
+        ExportProgress: The export counters, or None on failure.
     """
-    fields = "name,email,phone,ssn,password,ip,last_login,user_agent"
+    fields = USER_FIELDS
     columns = fields.split(',')
     query = "SELECT {} FROM users;".format(fields)
+    params = ()
+    if batch_size is None:
+        batch_size = int(os.getenv("PERSONAL_DATA_BATCH_SIZE", "0"))
+    if watermark is None:
+        watermark = os.getenv("PERSONAL_DATA_WATERMARK")
     info_logger = get_logger()
     connection = get_db()
     if connection:
+        progress = ExportProgress()
+        mark = None
+        if watermark:
+            mark = Watermark(watermark)
+            where = " WHERE last_login IS NOT NULL" if mark.started else ""
+            if mark.last_login is not None:
+                where += (" AND (last_login > {0} OR "
+                          "(last_login = {0} AND email > {0}))").format(
+                              placeholder(connection))
+                params = (mark.last_login, mark.last_login, mark.email)
+            query = "SELECT {} FROM users{} ORDER BY last_login, email;" \
+                .format(fields, where)
         try:
-            with connection.cursor() as cursor:
-                cursor.execute(query)
-                rows = cursor.fetchall()
-                for row in rows:
-                    record = map(
-                        lambda x: '{}={}'.format(x[0], x[1]),
-                        zip(columns, row),
-                    )
-                    msg = '{};'.format('; '.join(list(record)))
-                    args = ("user_data", logging.INFO, None, None, msg,
-                            None, None)
-                    log_record = logging.LogRecord(*args)
-                    info_logger.handle(log_record)
+            with closing(connection.cursor()) as cursor:
+                cursor.execute(query, params)
+                for rows in fetch_batches(cursor, batch_size):
+                    log_rows(info_logger, columns, rows)
+                    if mark is not None and rows:
+                        last = dict(zip(columns, rows[-1]))
+                        mark.update(last['last_login'], last['email'])
+                    progress.update(len(rows))
+                    logging.debug("Exported %d rows (%.0f rows/sec)",
+                                  progress.rows, progress.rows_per_sec)
+            return progress
         except mysql.connector.Error as err:
             logging.error("Database query error: %s", err)
         finally:
@@ -124,14 +1206,80 @@ class RedactingFormatter(logging.Formatter):
     FORMAT_FIELDS = ('name', 'levelname', 'asctime', 'message')
     SEPARATOR = ";"
 
-    def __init__(self, fields: List[str]):
+    def __init__(self, fields: List[str],
+                 cache: RedactionPlanCache = None, engine: str = None):
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self.engine = select_engine(fields, engine)
+        self.cache = plan_cache if cache is None else cache
+        self.plan = self.cache.get(fields, self.REDACTION, self.SEPARATOR,
+                                   self.engine)
+        self.identity = redaction_identity(fields, self.REDACTION,
+                                           self.SEPARATOR)
+        self.keys = frozenset(fields)
+        self.row_fields = fields if isinstance(fields, Mapping) \
+            else self.keys
+        self.probes = tuple('{}='.format(field) for field in fields)
+        self.redacted = 0
+        self.skipped = 0
+        self.structured = 0
+        self.reused = 0
+
+    def has_pii(self, msg: str) -> bool:
+        """
+        Checks whether a formatted line contains any `field=` probe,
+        i.e. whether the redaction engine could change it at all.
+
+        Args:
+            msg (str): Formatted log line.
+
+        Returns:
+            bool: True if the line needs to be redacted.
+        """
+        for probe in self.probes:
+            if probe in msg:
+                return True
+        return False
+
+    def _format_redacted(self, record: logging.LogRecord) -> str:
+        """
+        Formats a record whose message is already redacted, redacting
+        only its exception and stack text. The unredacted exception
+        text is not cached on the record, which other handlers share.
+
+        Args:
+            record (logging.LogRecord): Log record to format.
+
+        Returns:
+            str: Formatted and redacted log record.
+        """
+        record.message = record.getMessage()
+        if self.usesTime():
+            record.asctime = self.formatTime(record, self.datefmt)
+        msg = self.formatMessage(record)
+        extra = []
+        if record.exc_text:
+            extra.append(record.exc_text)
+        elif record.exc_info:
+            extra.append(self.formatException(record.exc_info))
+        if record.stack_info:
+            extra.append(self.formatStack(record.stack_info))
+        if not extra:
+            return msg
+        return "{}\n{}".format(msg, self.plan.redact("\n".join(extra)))
 
     def format(self, record: logging.LogRecord) -> str:
         """
         Formats a LogRecord, redacting specified fields.
 
+        A record already redacted by a `RedactingFilter` with the same
+        fields, policies, redaction and separator is formatted as is.
+        A record carrying a `row` mapping has its message built from
+        that mapping with the fields masked by key, so the line is
+        never parsed back; any other record is redacted by the plan.
+        In the first two cases the exception and stack text are still
+        redacted by the plan.
+
         Args:
             record (logging.LogRecord): Log record to format.
 
@@ -139,14 +1287,95 @@ class RedactingFormatter(logging.Formatter):
             str: Formatted and redacted log record.
         """
         try:
+            identity = getattr(record, 'redaction_identity', None)
+            if identity == self.identity:
+                self.reused += 1
+                return self._format_redacted(record)
+            row = getattr(record, 'row', None)
+            if row is not None:
+                self.structured += 1
+                record.msg = format_row(row, self.row_fields,
+                                        self.REDACTION)
+                record.args = None
+                return self._format_redacted(record)
             msg = super(RedactingFormatter, self).format(record)
-            txt = filter_datum(self.fields, self.REDACTION, msg,
-                               self.SEPARATOR)
+            if not self.has_pii(msg):
+                self.skipped += 1
+                return msg
+            self.redacted += 1
+            txt = self.plan.redact(msg)
             return txt
         except Exception as e:
             logging.error("Formatting error: %s", e)
             return record.getMessage()
 
 
+class RedactingFilter(logging.Filter):
+    """
+    A logger filter that redacts the message of a record once, before
+    it is handed to the handlers, and marks the record with the identity
+    of its redaction so that a `RedactingFormatter` redacting the same
+    way reuses the redacted message. Formatters with other fields or
+    policies redact the record again.
+    """
+
+    def __init__(self, fields: List[str],
+                 cache: RedactionPlanCache = None, engine: str = None):
+        """
+        Resolves the redaction plan of the fields.
+
+        Args:
+            fields (List[str]): List of fields to redact, or mapping
+                of fields to policies for the `policy` engine.
+            cache (RedactionPlanCache): Plan cache, `plan_cache` by
+                default.
+            engine (str): Name of the redaction engine in `engines`,
+                chosen by `select_engine` if omitted.
+
+        Raises:
+            ValueError: If the engine cannot apply the policies.
+        """
+        super(RedactingFilter, self).__init__()
+        self.fields = fields
+        self.keys = frozenset(fields)
+        self.row_fields = fields if isinstance(fields, Mapping) \
+            else self.keys
+        self.probes = tuple('{}='.format(field) for field in fields)
+        cache = plan_cache if cache is None else cache
+        self.plan = cache.get(fields, RedactingFormatter.REDACTION,
+                              RedactingFormatter.SEPARATOR,
+                              select_engine(fields, engine))
+        self.identity = redaction_identity(fields,
+                                           RedactingFormatter.REDACTION,
+                                           RedactingFormatter.SEPARATOR)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """
+        Replaces the message of a record by its redacted version.
+
+        Args:
+            record (logging.LogRecord): Log record to redact.
+
+        Returns:
+            bool: Always True, no record is dropped.
+        """
+        if getattr(record, 'redaction_identity', None) == self.identity:
+            return True
+        row = getattr(record, 'row', None)
+        if row is not None:
+            msg = format_row(row, self.row_fields,
+                             RedactingFormatter.REDACTION)
+        else:
+            msg = record.getMessage()
+            for probe in self.probes:
+                if probe in msg:
+                    msg = self.plan.redact(msg)
+                    break
+        record.msg = msg
+        record.args = None
+        record.redaction_identity = self.identity
+        return True
+
+
 if __name__ == "__main__":
     main()
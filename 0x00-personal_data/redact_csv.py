@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+A command-line tool for producing a redacted copy of a CSV export
+such as `user_data.csv`. The PII columns are found by header name
+once and every cell of those columns is replaced by the redaction
+string, without any per-cell pattern matching. Rows are streamed in
+fixed-size chunks so the input is never loaded fully in memory.
+"""
+import csv
+import sys
+import argparse
+import itertools
+from typing import List, TextIO
+
+from filtered_logger import PII_FIELDS, RedactingFormatter
+
+CHUNK_ROWS = 10000
+
+
+def redact_csv(input: TextIO, output: TextIO,
+               fields: List[str] = PII_FIELDS,
+               redaction: str = RedactingFormatter.REDACTION,
+               chunk_rows: int = CHUNK_ROWS) -> int:
+    """
+    Copies a CSV stream, masking the columns named in `fields`.
+
+    The header is copied as is and the data rows are written with
+    every cell quoted, like the exports.
+
+    Args:
+        input (TextIO): CSV stream with a header row.
+        output (TextIO): Stream receiving the redacted CSV.
+        fields (List[str]): Names of the columns to redact.
+        redaction (str): Redaction string.
+        chunk_rows (int): Number of rows read and written at once.
+
+    Returns:
+        int: The number of data rows written.
+    """
+    reader = csv.reader(input)
+    header = next(reader, None)
+    if header is None:
+        return 0
+    csv.writer(output, lineterminator='\n').writerow(header)
+    masked = [i for i, column in enumerate(header) if column in fields]
+    writer = csv.writer(output, quoting=csv.QUOTE_ALL, lineterminator='\n')
+    count = 0
+    while True:
+        chunk = list(itertools.islice(reader, chunk_rows))
+        if not chunk:
+            return count
+        for row in chunk:
+            for i in masked:
+                if i < len(row):
+                    row[i] = redaction
+        writer.writerows(chunk)
+        count += len(chunk)
+
+
+def main() -> None:
+    """
+    Parses the command-line arguments and redacts the CSV file.
+    """
+    parser = argparse.ArgumentParser(
+        description="Redact PII columns in a CSV export.")
+    parser.add_argument('input', help="CSV file to redact")
+    parser.add_argument('-o', '--output',
+                        help="redacted CSV file (standard output if omitted)")
+    parser.add_argument('-f', '--fields', default=','.join(PII_FIELDS),
+                        help="comma-separated columns to redact")
+    parser.add_argument('-r', '--redaction',
+                        default=RedactingFormatter.REDACTION,
+                        help="redaction string")
+    parser.add_argument('-c', '--chunk-rows', type=int, default=CHUNK_ROWS,
+                        help="number of rows processed at once")
+    args = parser.parse_args()
+    fields = args.fields.split(',')
+    with open(args.input, 'r', newline='') as input:
+        if args.output is None:
+            redact_csv(input, sys.stdout, fields, args.redaction,
+                       args.chunk_rows)
+            return
+        with open(args.output, 'w', newline='') as output:
+            redact_csv(input, output, fields, args.redaction,
+                       args.chunk_rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Unit tests for `filtered_logger.ConnectionPool`, run against SQLite
+and against a fake DB-API connection.
+"""
+import time
+import sqlite3
+import threading
+import unittest
+
+from filtered_logger import ConnectionPool
+
+
+class FakeConnection:
+    """
+    A DB-API connection whose health can be switched off.
+    """
+
+    def __init__(self):
+        """
+        Initializes an open, healthy connection.
+        """
+        self.healthy = True
+        self.closed = False
+
+    def cursor(self):
+        """
+        Returns a cursor, failing if the connection is unhealthy.
+        """
+        if not self.healthy:
+            raise sqlite3.OperationalError("connection lost")
+        return sqlite3.connect(":memory:").cursor()
+
+    def close(self):
+        """
+        Closes the connection.
+        """
+        self.closed = True
+
+
+def sqlite_connect():
+    """
+    Opens an in-memory SQLite connection usable from any thread.
+    """
+    return sqlite3.connect(":memory:", check_same_thread=False)
+
+
+class TestConnectionPool(unittest.TestCase):
+    """
+    Tests of the connection pool.
+    """
+
+    def test_reuse(self):
+        """
+        A released connection is handed out again.
+        """
+        pool = ConnectionPool(size=2, connect=sqlite_connect)
+        with pool.connection() as first:
+            first.execute("SELECT 1")
+        with pool.connection() as second:
+            self.assertIs(second, first)
+        self.assertEqual(pool.created, 1)
+        pool.close()
+
+    def test_unhealthy_connection_is_replaced(self):
+        """
+        A connection failing the health check is closed and replaced.
+        """
+        pool = ConnectionPool(size=1, connect=FakeConnection)
+        first = pool.acquire()
+        pool.release(first)
+        first.healthy = False
+        second = pool.acquire()
+        self.assertIsNot(second, first)
+        self.assertTrue(first.closed)
+        self.assertEqual(pool.recycled, 1)
+        self.assertEqual(pool.created, 1)
+
+    def test_idle_connection_is_recycled(self):
+        """
+        A connection idle longer than `max_idle` is not reused.
+        """
+        pool = ConnectionPool(size=1, max_idle=0.01, connect=FakeConnection)
+        first = pool.acquire()
+        pool.release(first)
+        time.sleep(0.05)
+        second = pool.acquire()
+        self.assertIsNot(second, first)
+        self.assertTrue(first.closed)
+        self.assertEqual(pool.recycled, 1)
+
+    def test_acquire_timeout(self):
+        """
+        A full pool returns None once the timeout expires.
+        """
+        pool = ConnectionPool(size=1, connect=FakeConnection)
+        held = pool.acquire()
+        started = time.monotonic()
+        self.assertIsNone(pool.acquire(timeout=0.05))
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        pool.release(held)
+        self.assertIs(pool.acquire(timeout=0.05), held)
+
+    def test_waiter_gets_released_connection(self):
+        """
+        A thread blocked on a full pool gets the next released one.
+        """
+        pool = ConnectionPool(size=1, connect=FakeConnection)
+        held = pool.acquire()
+        result = []
+        waiter = threading.Thread(target=lambda: result.append(
+            pool.acquire(timeout=5)))
+        waiter.start()
+        time.sleep(0.05)
+        pool.release(held)
+        waiter.join()
+        self.assertEqual(result, [held])
+
+    def test_failed_connect_wakes_waiter(self):
+        """
+        A slot freed by a failed connection is taken by a waiter.
+        """
+        attempts = []
+
+        def connect():
+            attempts.append(None)
+            if len(attempts) == 1:
+                time.sleep(0.1)
+                return None
+            return FakeConnection()
+
+        pool = ConnectionPool(size=1, connect=connect)
+        failing = threading.Thread(target=pool.acquire)
+        failing.start()
+        time.sleep(0.02)
+        result = []
+        waiter = threading.Thread(target=lambda: result.append(
+            pool.acquire(timeout=5)))
+        waiter.start()
+        failing.join()
+        waiter.join(2)
+        self.assertFalse(waiter.is_alive())
+        self.assertIsInstance(result[0], FakeConnection)
+        self.assertEqual(pool.created, 1)
+
+    def test_raising_connect_frees_slot(self):
+        """
+        A factory raising an error gives its slot back.
+        """
+        attempts = []
+
+        def connect():
+            attempts.append(None)
+            if len(attempts) == 1:
+                raise sqlite3.OperationalError("unable to open database")
+            return FakeConnection()
+
+        pool = ConnectionPool(size=1, connect=connect)
+        with self.assertRaises(sqlite3.OperationalError):
+            pool.acquire()
+        self.assertEqual(pool.created, 0)
+        self.assertIsInstance(pool.acquire(timeout=0.1), FakeConnection)
+
+    def test_raising_connect_wakes_waiter(self):
+        """
+        A slot freed by a raising factory is taken by a waiter.
+        """
+        attempts = []
+
+        def connect():
+            attempts.append(None)
+            if len(attempts) == 1:
+                time.sleep(0.1)
+                raise sqlite3.OperationalError("unable to open database")
+            return FakeConnection()
+
+        def acquire_failing():
+            try:
+                pool.acquire()
+            except sqlite3.OperationalError:
+                pass
+
+        pool = ConnectionPool(size=1, connect=connect)
+        failing = threading.Thread(target=acquire_failing)
+        failing.start()
+        time.sleep(0.02)
+        result = []
+        waiter = threading.Thread(target=lambda: result.append(
+            pool.acquire(timeout=5)))
+        waiter.start()
+        failing.join()
+        waiter.join(2)
+        self.assertFalse(waiter.is_alive())
+        self.assertIsInstance(result[0], FakeConnection)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the redaction plans and logging classes of
+`filtered_logger`.
+"""
+import io
+import logging
+import unittest
+
+from filtered_logger import (PII_FIELDS, RedactingFilter, RedactingFormatter,
+                             RedactionPlan, TokenRedactionPlan)
+
+
+class TestTokenRedactionPlan(unittest.TestCase):
+    """
+    Tests of the tokenizer redaction engine.
+    """
+
+    def test_same_output_as_regex(self):
+        """
+        The tokenizer redacts like the regex engine.
+        """
+        lines = ("name=bob;email=bob@x.com;ip=1.2.3.4;",
+                 "username=bob;", "msg=hello name=bob;", "a=name=b;c")
+        regex = RedactionPlan(PII_FIELDS, "***", ";")
+        tokenizer = TokenRedactionPlan(PII_FIELDS, "***", ";")
+        for line in lines:
+            self.assertEqual(tokenizer.redact(line), regex.redact(line))
+
+    def test_multi_character_separator_is_rejected(self):
+        """
+        A separator the regex would treat as a character set is
+        rejected.
+        """
+        with self.assertRaises(ValueError):
+            TokenRedactionPlan(PII_FIELDS, "***", ", ")
+
+
+class TestRedactingFilter(unittest.TestCase):
+    """
+    Tests of the records redacted once by a `RedactingFilter`.
+    """
+
+    def setUp(self):
+        """
+        Builds a logger with a filter and a formatter on one stream.
+        """
+        self.stream = io.StringIO()
+        handler = logging.StreamHandler(self.stream)
+        self.formatter = RedactingFormatter(PII_FIELDS)
+        handler.setFormatter(self.formatter)
+        self.logger = logging.Logger("test_redacting_filter")
+        self.logger.addFilter(RedactingFilter(PII_FIELDS))
+        self.logger.addHandler(handler)
+
+    def test_message_is_reused(self):
+        """
+        The formatter reuses the message redacted by the filter.
+        """
+        self.logger.info("name=bob;ip=1.2.3.4;")
+        self.assertIn("name=***;ip=1.2.3.4;", self.stream.getvalue())
+        self.assertEqual(self.formatter.reused, 1)
+
+    def test_exception_text_is_redacted(self):
+        """
+        The exception text of a reused record is redacted too.
+        """
+        try:
+            raise ValueError("email=bob@x.com;password=hunter2;")
+        except ValueError:
+            self.logger.exception("name=bob;")
+        output = self.stream.getvalue()
+        self.assertNotIn("hunter2", output)
+        self.assertNotIn("bob@x.com", output)
+        self.assertIn("password=***;", output)
+
+    def test_stack_text_is_redacted(self):
+        """
+        The stack text of a reused record, which quotes the logging
+        call, is redacted too.
+        """
+        self.logger.info("name=bob;", stack_info=True)
+        self.assertNotIn("name=bob", self.stream.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -69,7 +69,7 @@ class BasicAuth(Auth):
         """
         if type(user_email) == str and type(user_pwd) == str:
             try:
-                users = User.search({'email': user_email})
+                users = User.search({'email': user_email}, limit=1)
             except Exception:
                 return None
             if len(users) <= 0:
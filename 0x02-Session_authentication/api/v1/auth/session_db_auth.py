@@ -45,7 +45,8 @@ class SessionDBAuth(SessionExpAuth):
         the session has expired.
         """
         try:
-            sessions = UserSession.search({"session_id": session_id})
+            sessions = UserSession.search({"session_id": session_id},
+                                          limit=1)
         except Exception:
             return None
         if len(sessions) <= 0:
@@ -70,7 +71,8 @@ class SessionDBAuth(SessionExpAuth):
         """
         session_id = self.session_cookie(request)
         try:
-            sessions = UserSession.search({"session_id": session_id})
+            sessions = UserSession.search({"session_id": session_id},
+                                          limit=1)
         except Exception:
             return False
         if len(sessions) <= 0:
@@ -40,7 +40,7 @@ def login() -> Tuple[str, int]:
     if password is None or len(password.strip()) == 0:
         return jsonify({"error": "password missing"}), 400
     try:
-        users = User.search({'email': email})
+        users = User.search({'email': email}, limit=1)
     except Exception:
         return jsonify(not_found_res), 404
     if len(users) <= 0:
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""Benchmarks of the in-memory model storage.
+"""
+import os
+import sys
+import timeit
+import argparse
+import tempfile
+import tracemalloc
+from typing import List
+
+from models.base import DATA, INDEXES
+from models.user import User
+from models.user_session import UserSession
+
+
+def populate(count: int) -> List[str]:
+    """Fill the User store with `count` users without touching the
+    database file, and return their emails.
+    """
+    DATA['User'] = {}
+    emails = []
+    for i in range(count):
+        email = "user{}@example.com".format(i)
+        user = User(email=email, first_name="First", last_name="Last")
+        user.password = "pwd"
+        DATA['User'][user.id] = user
+        emails.append(email)
+    User.reindex()
+    return emails
+
+
+def bench_search(sizes: List[int], number: int = 5) -> None:
+    """Print the time of an email lookup through `User.search` with
+    and without the email index.
+    """
+    print("{:>10} {:>14} {:>14} {:>10}".format(
+        "users", "scan (us)", "index (us)", "speedup"))
+    for size in sizes:
+        emails = populate(size)
+        target = {'email': emails[size // 2]}
+        indexed = min(timeit.repeat(lambda: User.search(target),
+                                    number=number, repeat=3)) / number
+        indexes = INDEXES.pop('User')
+        scan = min(timeit.repeat(lambda: User.search(target),
+                                 number=number, repeat=3)) / number
+        INDEXES['User'] = indexes
+        print("{:>10} {:>14.1f} {:>14.1f} {:>9.0f}x".format(
+            size, scan * 1e6, indexed * 1e6, scan / indexed))
+
+
+def bench_query(sizes: List[int], number: int = 5) -> None:
+    """Print the time of a scan on a non-indexed attribute returning
+    every match, the first match only, and the first page of 10 in
+    `created_at` order.
+    """
+    print("{:>10} {:>14} {:>14} {:>14}".format(
+        "users", "all (ms)", "first (us)", "page (ms)"))
+    for size in sizes:
+        populate(size)
+        target = {'first_name': "First"}
+        full = min(timeit.repeat(lambda: User.search(target),
+                                 number=number, repeat=3)) / number
+        first = min(timeit.repeat(lambda: User.search(target, limit=1),
+                                  number=number, repeat=3)) / number
+        page = min(timeit.repeat(
+            lambda: User.search(target, order_by='-created_at', limit=10),
+            number=number, repeat=3)) / number
+        print("{:>10} {:>14.1f} {:>14.1f} {:>14.1f}".format(
+            size, full * 1e3, first * 1e6, page * 1e3))
+
+
+def bench_load(sizes: List[int]) -> None:
+    """Print the time and memory taken by `User.load_from_file` in the
+    eager and lazy loading modes, and by a first lookup afterwards.
+    """
+    print("{:>10} {:>6} {:>10} {:>10} {:>12}".format(
+        "users", "mode", "load (s)", "MiB", "1st get (ms)"))
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        try:
+            for size in sizes:
+                populate(size)
+                User.save_to_file()
+                some_id = next(iter(DATA['User']))
+                for mode in ("eager", "lazy"):
+                    DATA['User'] = {}
+                    os.environ["BASE_LOADING"] = mode
+                    load = timeit.timeit(User.load_from_file, number=1)
+                    DATA['User'] = {}
+                    tracemalloc.start()
+                    User.load_from_file()
+                    memory = tracemalloc.get_traced_memory()[0]
+                    tracemalloc.stop()
+                    get = timeit.timeit(lambda: User.get(some_id), number=1)
+                    print("{:>10} {:>6} {:>10.2f} {:>10.1f} {:>12.3f}".format(
+                        size, mode, load, memory / 2 ** 20, get * 1e3))
+        finally:
+            os.environ.pop("BASE_LOADING", None)
+            os.chdir(cwd)
+
+
+def bench_snapshot(sizes: List[int]) -> None:
+    """Print the save time, eager load time and file size of the JSON
+    and binary snapshot formats.
+    """
+    print("{:>10} {:>7} {:>10} {:>10} {:>10}".format(
+        "users", "format", "save (s)", "load (s)", "MiB"))
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        try:
+            for size in sizes:
+                populate(size)
+                for fmt, ext in (("json", "json"), ("binary", "bin")):
+                    os.environ["BASE_SNAPSHOT_FORMAT"] = fmt
+                    save = timeit.timeit(User.save_to_file, number=1)
+                    load = timeit.timeit(User.load_from_file, number=1)
+                    file_size = os.path.getsize(".db_User.{}".format(ext))
+                    print("{:>10} {:>7} {:>10.2f} {:>10.2f} {:>10.1f}".format(
+                        size, fmt, save, load, file_size / 2 ** 20))
+        finally:
+            os.environ.pop("BASE_SNAPSHOT_FORMAT", None)
+            os.chdir(cwd)
+
+
+def bench_memory(count: int = 20000) -> None:
+    """Print the memory taken by one User and one UserSession, when
+    created and once serialized with `to_json` as `save_to_file` does.
+    """
+    def per_object(cls, **kwargs):
+        tracemalloc.start()
+        objs = [cls(**kwargs) for _ in range(count)]
+        fresh = tracemalloc.get_traced_memory()[0]
+        for obj in objs:
+            obj.to_json(True)
+        serialized = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return ((fresh - sys.getsizeof(objs)) / count,
+                (serialized - sys.getsizeof(objs)) / count)
+
+    user = per_object(User, email="user12345@example.com",
+                      first_name="First", last_name="Last",
+                      _password="0" * 64)
+    session = per_object(UserSession, user_id="0" * 36, session_id="1" * 36)
+    print("{:>12} {:>10} {:>14}".format("model", "B/object", "after to_json"))
+    print("{:>12} {:>10.0f} {:>14.0f}".format("User", *user))
+    print("{:>12} {:>10.0f} {:>14.0f}".format("UserSession", *session))
+
+
+def main() -> None:
+    """Parse the command-line arguments and run the benchmarks.
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark the model storage.")
+    parser.add_argument('-s', '--sizes', default="10000,100000,1000000",
+                        help="comma-separated numbers of users")
+    parser.add_argument('--query', action='store_true',
+                        help="benchmark early termination and paging")
+    parser.add_argument('--load', action='store_true',
+                        help="benchmark eager and lazy loading")
+    parser.add_argument('--snapshot', action='store_true',
+                        help="benchmark the JSON and binary snapshots")
+    parser.add_argument('--memory', action='store_true',
+                        help="measure the memory taken by one object")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+    if args.memory:
+        bench_memory()
+        return
+    if args.snapshot:
+        bench_snapshot(sizes)
+        return
+    if args.query:
+        bench_query(sizes)
+        return
+    if args.load:
+        bench_load(sizes)
+        return
+    bench_search(sizes)
+
+
+if __name__ == "__main__":
+    main()
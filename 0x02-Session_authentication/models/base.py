@@ -1,40 +1,553 @@
 #!/usr/bin/env python3
 """Base module.
 """
+import os
 import json
+import heapq
+import operator
+import itertools
+import sys
 import uuid
+import array
+import struct
+import threading
 from os import path
-from datetime import datetime
-from typing import TypeVar, List, Iterable
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import (TypeVar, List, Iterable, Iterator, Tuple, Callable,
+                    Sequence, Union)
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
 DATA = {}
+INDEXES = {}
+JOURNAL_MAX_BYTES = 1024 * 1024
+SNAPSHOT_MAGIC = b"BDBS"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<4sH")
+TIMESTAMP_KEYS = ('created_at', 'updated_at')
+EPOCH = datetime(1970, 1, 1)
+_FILE_LOCK = threading.Lock()
+_SNAPSHOT_LOCK = threading.Lock()
+_COMPACTIONS = set()
+_COMPACTIONS_LOCK = threading.Lock()
+_LOCKS = {}
+_LOCKS_LOCK = threading.Lock()
+OPERATORS = {
+    'eq': operator.eq,
+    'ne': operator.ne,
+    'lt': operator.lt,
+    'le': operator.le,
+    'gt': operator.gt,
+    'ge': operator.ge,
+    'in': lambda value, values: value in values,
+}
+
+
+class ReadWriteLock():
+    """A lock held by any number of readers or by a single writer.
+
+    Waiting writers are served before new readers so that a steady
+    stream of searches cannot starve a save. The lock is not
+    reentrant.
+    """
+
+    def __init__(self):
+        """Initialize an unlocked lock.
+        """
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        """Hold the lock as a reader.
+        """
+        with self._cond:
+            while self._writing or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """Hold the lock as the only writer.
+        """
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writing or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+
+def _conditions(attributes: dict) -> List[Tuple[str, str, object]]:
+    """Split query keys such as `created_at__lt` into an attribute
+    name and one of the `OPERATORS`, equality being the default.
+    """
+    conditions = []
+    for key, value in attributes.items():
+        name, _, op = key.rpartition('__')
+        if not name or op not in OPERATORS:
+            name, op = key, 'eq'
+        conditions.append((name, op, value))
+    return conditions
+
+
+def _sort_key(order: str) -> Tuple[Callable, bool]:
+    """Return the sort key and direction of an attribute name, prefixed
+    by `-` for a descending order. None values sort last either way.
+    """
+    name, descending = order.lstrip('-'), order[:1] == '-'
+
+    def key(obj):
+        value = getattr(obj, name, None)
+        return ((value is None) != descending, value)
+    return key, descending
+
+
+def _class_lock(s_class: str) -> ReadWriteLock:
+    """Return the lock guarding the DATA and INDEXES of a class.
+    """
+    lock = _LOCKS.get(s_class)
+    if lock is None:
+        with _LOCKS_LOCK:
+            lock = _LOCKS.setdefault(s_class, ReadWriteLock())
+    return lock
+
+
+def _storage_mode() -> str:
+    """Return the persistence mode set by `BASE_STORAGE`: `snapshot`
+    rewrites the whole file on every mutation, `journal` appends the
+    mutation to a journal compacted in the background.
+    """
+    return os.getenv("BASE_STORAGE", "snapshot")
+
+
+def _replay_journal(objs_json: dict, file_path: str):
+    """Apply the entries of a journal file to a snapshot dictionary.
+
+    Replaying is idempotent, and a truncated last line left by a crash
+    is ignored.
+    """
+    if not path.exists(file_path):
+        return
+    with open(file_path, 'r') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get('op') == 'save':
+                objs_json[entry['id']] = entry['obj']
+            elif entry.get('op') == 'remove':
+                objs_json.pop(entry['id'], None)
+
+
+def _snapshot_path(s_class: str) -> str:
+    """Return the snapshot file of a class for the format set by
+    `BASE_SNAPSHOT_FORMAT`, `json` (default) or `binary`.
+    """
+    if os.getenv("BASE_SNAPSHOT_FORMAT", "json") == 'binary':
+        return ".db_{}.bin".format(s_class)
+    return ".db_{}.json".format(s_class)
+
+
+def _json_default(value):
+    """Serialize the datetimes of records decoded from a binary
+    snapshot and not turned into objects yet.
+    """
+    if type(value) is datetime:
+        return value.strftime(TIMESTAMP_FORMAT)
+    raise TypeError("{} is not JSON serializable".format(type(value)))
+
+
+def _pack_array(typecode: str, values: Iterable) -> bytes:
+    """Pack integers as a count followed by a little-endian array.
+    """
+    values = array.array(typecode, values)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return struct.pack("<I", len(values)) + values.tobytes()
+
+
+def _unpack_array(typecode: str, data: bytes,
+                  offset: int) -> Tuple[array.array, int]:
+    """Unpack an array packed by `_pack_array` at an offset, and return
+    it with the offset of what follows.
+    """
+    count, = struct.unpack_from("<I", data, offset)
+    offset += 4
+    values = array.array(typecode)
+    end = offset + count * values.itemsize
+    if end > len(data):
+        raise ValueError("Truncated binary snapshot")
+    values.frombytes(data[offset:end])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values, end
+
+
+def encode_snapshot(records: dict) -> bytes:
+    """Encode records into the binary snapshot format.
+
+    The format is a `SNAPSHOT_HEADER` with the magic and version,
+    followed by little-endian arrays, each prefixed with its length:
+
+    - the UTF-8 length of each distinct string, then the strings,
+    - the number of keys of each schema, then the keys of all the
+      schemas as string indexes; records with the same keys share
+      a schema,
+    - the schema and ID string index of each record,
+    - the kind of each value, then its code: a string index for a
+      string, seconds since the epoch for a datetime, and the string
+      index of its JSON text for any other value.
+    """
+    strings, string_ids = [], {}
+    schemas, schema_ids = [], {}
+    row_schemas, row_ids, kinds, codes = [], [], [], []
+
+    def intern(value):
+        idx = string_ids.get(value)
+        if idx is None:
+            idx = string_ids[value] = len(strings)
+            strings.append(value)
+        return idx
+
+    for obj_id, record in records.items():
+        keys = tuple(intern(key) for key in record)
+        schema = schema_ids.get(keys)
+        if schema is None:
+            schema = schema_ids[keys] = len(schemas)
+            schemas.append(keys)
+        row_schemas.append(schema)
+        row_ids.append(intern(obj_id))
+        for key, value in record.items():
+            if type(value) is str and key in TIMESTAMP_KEYS:
+                try:
+                    value = datetime.strptime(value, TIMESTAMP_FORMAT)
+                except ValueError:
+                    pass
+            if type(value) is str:
+                kinds.append(0)
+                codes.append(intern(value))
+            elif type(value) is datetime:
+                kinds.append(1)
+                codes.append(int((value - EPOCH).total_seconds()))
+            else:
+                kinds.append(2)
+                codes.append(intern(json.dumps(value,
+                                               default=_json_default)))
+
+    encoded = [string.encode('utf-8', 'surrogatepass') for string in strings]
+    return b"".join((
+        SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION),
+        _pack_array('I', map(len, encoded)),
+        b"".join(encoded),
+        _pack_array('I', map(len, schemas)),
+        _pack_array('I', itertools.chain.from_iterable(schemas)),
+        _pack_array('I', row_schemas),
+        _pack_array('I', row_ids),
+        _pack_array('B', kinds),
+        _pack_array('q', codes),
+    ))
+
+
+def decode_snapshot(data: bytes) -> dict:
+    """Decode a binary snapshot into records keyed by ID, with the
+    timestamps as datetimes.
+    """
+    if len(data) < SNAPSHOT_HEADER.size:
+        raise ValueError("Not a binary snapshot")
+    magic, version = SNAPSHOT_HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError("Not a binary snapshot")
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(
+            "Unsupported binary snapshot version {}".format(version))
+    offset = SNAPSHOT_HEADER.size
+    lengths, offset = _unpack_array('I', data, offset)
+    strings = []
+    for length in lengths:
+        strings.append(data[offset:offset + length].decode(
+            'utf-8', 'surrogatepass'))
+        offset += length
+    schema_lengths, offset = _unpack_array('I', data, offset)
+    schema_keys, offset = _unpack_array('I', data, offset)
+    row_schemas, offset = _unpack_array('I', data, offset)
+    row_ids, offset = _unpack_array('I', data, offset)
+    kinds, offset = _unpack_array('B', data, offset)
+    codes, offset = _unpack_array('q', data, offset)
+
+    keys = iter(schema_keys)
+    schemas = [tuple(strings[next(keys)] for _ in range(length))
+               for length in schema_lengths]
+    kinds, codes = iter(kinds), iter(codes)
+    records = {}
+    for schema, obj_id in zip(row_schemas, row_ids):
+        record = {}
+        for key, kind, code in zip(schemas[schema], kinds, codes):
+            if kind == 0:
+                record[key] = strings[code]
+            elif kind == 1:
+                record[key] = EPOCH + timedelta(seconds=code)
+            else:
+                record[key] = json.loads(strings[code])
+        records[strings[obj_id]] = record
+    return records
+
+
+def _load_snapshot(file_path: str) -> dict:
+    """Read a snapshot file in either format.
+    """
+    if not path.exists(file_path):
+        return {}
+    if file_path.endswith(".bin"):
+        with open(file_path, 'rb') as f:
+            return decode_snapshot(f.read())
+    with open(file_path, 'r') as f:
+        return json.load(f)
+
+
+def _dump_snapshot(file_path: str, records: dict, binary: bool):
+    """Write a snapshot file in the binary or JSON format.
+
+    The snapshot is written to a temporary file renamed over the old
+    one, so a reader or a crash never sees a partly written file.
+    """
+    tmp_path = file_path + ".tmp"
+    if binary:
+        with open(tmp_path, 'wb') as f:
+            f.write(encode_snapshot(records))
+            f.flush()
+            os.fsync(f.fileno())
+    else:
+        with open(tmp_path, 'w') as f:
+            json.dump(records, f, default=_json_default)
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+
+
+def convert_json_snapshot(s_class: str) -> str:
+    """Convert the JSON snapshot of a class to the binary format and
+    return the path of the binary snapshot.
+    """
+    bin_path = ".db_{}.bin".format(s_class)
+    with _SNAPSHOT_LOCK:
+        records = _load_snapshot(".db_{}.json".format(s_class))
+        _dump_snapshot(bin_path, records, True)
+    return bin_path
+
+
+def _read_snapshot(s_class: str) -> dict:
+    """Read the snapshot of a class and replay its journals.
+    """
+    journal_path = ".db_{}.journal".format(s_class)
+    objs_json = _load_snapshot(_snapshot_path(s_class))
+    _replay_journal(objs_json, journal_path + ".compacting")
+    _replay_journal(objs_json, journal_path)
+    return objs_json
+
+
+def _compact(s_class: str):
+    """Fold the journal set aside for compaction into a new snapshot.
+
+    Only the snapshot lock is held, so appends to the live journal go
+    on while the snapshot is rewritten.
+    """
+    file_path = _snapshot_path(s_class)
+    compacting_path = ".db_{}.journal.compacting".format(s_class)
+    try:
+        with _SNAPSHOT_LOCK:
+            if not path.exists(compacting_path):
+                return
+            objs_json = _load_snapshot(file_path)
+            _replay_journal(objs_json, compacting_path)
+            _dump_snapshot(file_path, objs_json, file_path.endswith(".bin"))
+            os.remove(compacting_path)
+    finally:
+        with _COMPACTIONS_LOCK:
+            _COMPACTIONS.discard(s_class)
+
+
+def _start_compaction(s_class: str):
+    """Compact the journal set aside for compaction in a background
+    thread, unless a compaction of the class is already running.
+
+    A journal left over by a crash or a failed compaction is picked up
+    again the same way.
+    """
+    with _COMPACTIONS_LOCK:
+        if s_class in _COMPACTIONS:
+            return
+        _COMPACTIONS.add(s_class)
+    threading.Thread(target=_compact, args=(s_class,), daemon=True).start()
 
 
 class Base():
     """Base class.
+
+    Subclasses list in `INDEXED_ATTRIBUTES` the attributes `search`
+    should look up through a secondary index instead of a full scan.
+
+    The common attributes are stored in slots. A subclass declaring
+    `__slots__` for its own attributes never allocates a `__dict__`, which
+    keeps large numbers of instances compact; other subclasses keep a
+    regular `__dict__`.
+
+    The objects and indexes of each class are guarded by a reader/writer
+    lock: mutations hold it as a writer, and readers only hold it long
+    enough to copy the IDs they iterate over.
     """
+    __slots__ = ('id', 'created_at', 'updated_at')
+    INDEXED_ATTRIBUTES: Tuple[str, ...] = ()
 
     def __init__(self, *args: list, **kwargs: dict):
         """Initialize a Base instance.
         """
         s_class = str(self.__class__.__name__)
-        if DATA.get(s_class) is None:
-            DATA[s_class] = {}
+        DATA.setdefault(s_class, {})
 
         self.id = kwargs.get('id', str(uuid.uuid4()))
-        if kwargs.get('created_at') is not None:
+        if type(kwargs.get('created_at')) is datetime:
+            self.created_at = kwargs.get('created_at')
+        elif kwargs.get('created_at') is not None:
             self.created_at = datetime.strptime(kwargs.get('created_at'),
                                                 TIMESTAMP_FORMAT)
         else:
             self.created_at = datetime.utcnow()
-        if kwargs.get('updated_at') is not None:
+        if type(kwargs.get('updated_at')) is datetime:
+            self.updated_at = kwargs.get('updated_at')
+        elif kwargs.get('updated_at') is not None:
             self.updated_at = datetime.strptime(kwargs.get('updated_at'),
                                                 TIMESTAMP_FORMAT)
         else:
             self.updated_at = datetime.utcnow()
 
+    def __setattr__(self, name: str, value) -> None:
+        """Set an attribute, keeping the indexes of a stored object
+        in sync.
+        """
+        if name in self.INDEXED_ATTRIBUTES and self._is_stored():
+            cls = self.__class__
+            with _class_lock(cls.__name__).write():
+                cls._unindex(self.id, self)
+                super().__setattr__(name, value)
+                cls._index(self.id, self)
+        else:
+            super().__setattr__(name, value)
+
+    def _is_stored(self) -> bool:
+        """Tell if the object is the one stored in DATA.
+        """
+        s_class = self.__class__.__name__
+        obj_id = getattr(self, 'id', None)
+        return DATA.get(s_class, {}).get(obj_id) is self
+
+    def _attributes(self) -> dict:
+        """Return the attributes set on the object, in declaration
+        order, whether they live in slots or in `__dict__`.
+        """
+        result = {}
+        for klass in reversed(type(self).__mro__):
+            for name in klass.__dict__.get('__slots__', ()):
+                if name == '__dict__':
+                    continue
+                try:
+                    result[name] = getattr(self, name)
+                except AttributeError:
+                    pass
+        result.update(getattr(self, '__dict__', {}))
+        return result
+
+    @classmethod
+    def _indexed_values(cls, entry) -> Iterable[Tuple[str, object]]:
+        """Yield the indexed attributes of a DATA entry, either an
+        object or the JSON dictionary of a record not loaded yet.
+        """
+        for attr in cls.INDEXED_ATTRIBUTES:
+            if type(entry) is dict:
+                yield attr, entry.get(attr)
+            else:
+                yield attr, getattr(entry, attr, None)
+
+    @classmethod
+    def _index(cls, obj_id: str, entry, indexes: dict = None):
+        """Add a DATA entry to the indexes of the class.
+        """
+        if indexes is None:
+            indexes = INDEXES.setdefault(cls.__name__, {})
+        for attr, value in cls._indexed_values(entry):
+            try:
+                bucket = indexes.setdefault(attr, {}).setdefault(value, {})
+            except TypeError:
+                continue
+            bucket[obj_id] = None
+
+    @classmethod
+    def _unindex(cls, obj_id: str, entry):
+        """Remove a DATA entry from the indexes of the class.
+        """
+        indexes = INDEXES.get(cls.__name__, {})
+        for attr, value in cls._indexed_values(entry):
+            index = indexes.get(attr, {})
+            try:
+                bucket = index.get(value)
+            except TypeError:
+                continue
+            if bucket is not None:
+                bucket.pop(obj_id, None)
+                if len(bucket) == 0:
+                    del index[value]
+
+    @classmethod
+    def reindex(cls):
+        """Rebuild the indexes of the class from DATA.
+        """
+        s_class = cls.__name__
+        with _class_lock(s_class).write():
+            INDEXES[s_class] = cls._build_indexes(DATA.get(s_class, {}))
+
+    @classmethod
+    def _build_indexes(cls, store: dict) -> dict:
+        """Return new indexes of the class for a DATA dictionary.
+        """
+        indexes = {attr: {} for attr in cls.INDEXED_ATTRIBUTES}
+        for obj_id, entry in store.items():
+            cls._index(obj_id, entry, indexes)
+        return indexes
+
+    @classmethod
+    def _materialize(cls, obj_id: str) -> TypeVar('Base'):
+        """Return the object of an ID, building it from its JSON
+        dictionary the first time when the class was loaded lazily.
+        """
+        s_class = cls.__name__
+        entry = DATA[s_class].get(obj_id)
+        if type(entry) is not dict:
+            return entry
+        obj = cls(**entry)
+        with _class_lock(s_class).write():
+            store = DATA[s_class]
+            if store.get(obj_id) is entry:
+                store[obj_id] = obj
+                return obj
+            return store.get(obj_id)
+
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """Equality.
         """
@@ -48,7 +561,7 @@ class Base():
         """Convert the object a JSON dictionary.
         """
         result = {}
-        for key, value in self.__dict__.items():
+        for key, value in self._attributes().items():
             if not for_serialization and key[0] == '_':
                 continue
             if type(value) is datetime:
@@ -60,46 +573,106 @@ class Base():
     @classmethod
     def load_from_file(cls):
         """Load all objects from file.
+
+        With `BASE_LOADING=lazy`, only the JSON records are kept and
+        each object is built when `get`, `search` or `all` first
+        returns it.
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
-
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
+        with _SNAPSHOT_LOCK, _FILE_LOCK:
+            objs_json = _read_snapshot(s_class)
+        if path.exists(".db_{}.journal.compacting".format(s_class)):
+            _start_compaction(s_class)
+        if os.getenv("BASE_LOADING", "eager") == 'lazy':
+            store = objs_json
+        else:
+            store = {}
             for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+                store[obj_id] = cls(**obj_json)
+        indexes = cls._build_indexes(store)
+        with _class_lock(s_class).write():
+            DATA[s_class] = store
+            INDEXES[s_class] = indexes
 
     @classmethod
     def save_to_file(cls):
         """Save all objects to file.
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        file_path = _snapshot_path(s_class)
+        journal_path = ".db_{}.journal".format(s_class)
+        binary = file_path.endswith(".bin")
+        with _SNAPSHOT_LOCK, _FILE_LOCK:
+            with _class_lock(s_class).read():
+                items = list(DATA[s_class].items())
+            objs_json = {}
+            for obj_id, obj in items:
+                if type(obj) is dict:
+                    objs_json[obj_id] = obj
+                elif binary:
+                    objs_json[obj_id] = obj._attributes()
+                else:
+                    objs_json[obj_id] = obj.to_json(True)
+            _dump_snapshot(file_path, objs_json, binary)
+            for stale_path in (journal_path, journal_path + ".compacting"):
+                if path.exists(stale_path):
+                    os.remove(stale_path)
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+    @classmethod
+    def append_to_journal(cls, entry: dict):
+        """Append a mutation to the journal of the class, and hand the
+        journal over to a background compaction once it grows past
+        `BASE_JOURNAL_MAX_BYTES`. While a previous journal is still
+        being compacted, or was left over, the live journal keeps
+        growing and that compaction is (re)started instead.
+        """
+        s_class = cls.__name__
+        journal_path = ".db_{}.journal".format(s_class)
+        max_bytes = int(os.getenv("BASE_JOURNAL_MAX_BYTES",
+                                  JOURNAL_MAX_BYTES))
+        with _FILE_LOCK:
+            with open(journal_path, 'a') as f:
+                f.write(json.dumps(entry) + "\n")
+                size = f.tell()
+            compacting_path = journal_path + ".compacting"
+            if size < max_bytes:
+                return
+            if not path.exists(compacting_path):
+                os.replace(journal_path, compacting_path)
+        _start_compaction(s_class)
 
     def save(self):
         """Save current object.
         """
         s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        with _class_lock(s_class).write():
+            stored = DATA[s_class].get(self.id)
+            if stored is not self:
+                if stored is not None:
+                    self.__class__._unindex(self.id, stored)
+                DATA[s_class][self.id] = self
+                self.__class__._index(self.id, self)
+        if _storage_mode() == 'journal':
+            self.__class__.append_to_journal(
+                {'op': 'save', 'id': self.id, 'obj': self.to_json(True)})
+        else:
+            self.__class__.save_to_file()
 
     def remove(self):
         """Remove object.
         """
         s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        with _class_lock(s_class).write():
+            stored = DATA[s_class].pop(self.id, None)
+            if stored is not None:
+                self.__class__._unindex(self.id, stored)
+        if stored is not None:
+            if _storage_mode() == 'journal':
+                self.__class__.append_to_journal(
+                    {'op': 'remove', 'id': self.id})
+            else:
+                self.__class__.save_to_file()
 
     @classmethod
     def count(cls) -> int:
@@ -118,20 +691,87 @@ class Base():
     def get(cls, id: str) -> TypeVar('Base'):
         """Return one object by ID.
         """
-        s_class = cls.__name__
-        return DATA[s_class].get(id)
+        return cls._materialize(id)
 
     @classmethod
-    def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
+    def search(cls, attributes: dict = {},
+               where: Callable[[TypeVar('Base')], bool] = None,
+               order_by: Union[str, Sequence[str]] = None,
+               limit: int = None, offset: int = 0) -> List[TypeVar('Base')]:
         """Search all objects with matching attributes.
+
+        Takes the same arguments as `query` and returns a list.
+        """
+        return list(cls.query(attributes, where, order_by, limit, offset))
+
+    @classmethod
+    def _candidate_ids(cls, conditions: List[Tuple[str, str, object]]
+                       ) -> List[str]:
+        """Return a copy of the IDs that may match the conditions.
+
+        The IDs come from the index of the first equality or `in`
+        condition on an indexed attribute, or from all the objects
+        otherwise.
         """
         s_class = cls.__name__
-        def _search(obj):
-            if len(attributes) == 0:
-                return True
-            for k, v in attributes.items():
-                if (getattr(obj, k) != v):
+        with _class_lock(s_class).read():
+            indexes = INDEXES.get(s_class, {})
+            for name, op, value in conditions:
+                if name not in indexes or op not in ('eq', 'in'):
+                    continue
+                index = indexes[name]
+                try:
+                    if op == 'eq':
+                        return list(index.get(value, {}))
+                    return list(dict.fromkeys(itertools.chain.from_iterable(
+                        index.get(v, {}) for v in value)))
+                except TypeError:
+                    continue
+            return list(DATA[s_class])
+
+    @classmethod
+    def query(cls, attributes: dict = {},
+              where: Callable[[TypeVar('Base')], bool] = None,
+              order_by: Union[str, Sequence[str]] = None,
+              limit: int = None, offset: int = 0) -> Iterator[TypeVar('Base')]:
+        """Iterate lazily over the objects with matching attributes.
+
+        A key of `attributes` is an attribute name, compared for
+        equality, or a name followed by `__` and one of the `OPERATORS`,
+        such as `created_at__lt`. `where` is an extra predicate called
+        with each object. `order_by` is an attribute name, or a list of
+        them, prefixed by `-` for a descending order.
+
+        Without `order_by`, objects are built and matched only as the
+        iteration requests them, so taking the first match stops the
+        scan there. With `order_by`, every match is collected first.
+        """
+        conditions = _conditions(attributes)
+
+        def _match(obj):
+            if obj is None:
+                return False
+            for name, op, value in conditions:
+                try:
+                    if not OPERATORS[op](getattr(obj, name), value):
+                        return False
+                except TypeError:
                     return False
-            return True
+            return where is None or bool(where(obj))
 
-        return list(filter(_search, DATA[s_class].values()))
+        matches = filter(_match, map(cls._materialize,
+                                     cls._candidate_ids(conditions)))
+        stop = None if limit is None else offset + limit
+        if order_by is not None:
+            if type(order_by) is str:
+                order_by = (order_by,)
+            if len(order_by) == 1 and stop is not None:
+                key, descending = _sort_key(order_by[0])
+                pick = heapq.nlargest if descending else heapq.nsmallest
+                matches = pick(stop, matches, key=key)
+            else:
+                matches = list(matches)
+                for order in reversed(order_by):
+                    key, descending = _sort_key(order)
+                    matches.sort(key=key, reverse=descending)
+        return itertools.islice(matches, offset, stop)
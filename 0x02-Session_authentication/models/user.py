@@ -8,6 +8,8 @@ from models.base import Base
 class User(Base):
     """User class.
     """
+    __slots__ = ('email', '_password', 'first_name', 'last_name')
+    INDEXED_ATTRIBUTES = ('email',)
 
     def __init__(self, *args: list, **kwargs: dict):
         """Initialize a User instance.
@@ -9,6 +9,8 @@ class UserSession(Base):
         which is used to track user
     authentication and authorization information.
     """
+    __slots__ = ('user_id', 'session_id')
+    INDEXED_ATTRIBUTES = ('session_id',)
 
     def __init__(self, *args: list, **kwargs: dict):
         """Initializes a User session instance.
@@ -1,9 +1,14 @@
 #!/usr/bin/env python3
 """A module for authentication-related routines.
 """
+import os
+import time
 import bcrypt
+import asyncio
+import threading
 from uuid import uuid4
-from typing import Union
+from typing import Callable, Union
+from concurrent.futures import Future, ThreadPoolExecutor
 from sqlalchemy.orm.exc import NoResultFound
 
 from db import DB
@@ -25,6 +30,118 @@ def _hash_password(password: str) -> bytes:
         print(f"An error occurred: {e}")
 
 
+class HashingExecutor:
+    """A dedicated, bounded thread pool running bcrypt work for asyncio
+    front ends, with queue-depth and wait-time metrics.
+    """
+
+    def __init__(self, workers: int = None):
+        """Initializes the pool and its metrics.
+
+        Args:
+        - workers (int): Number of threads, the CPU count by default.
+        """
+        self.workers = workers or os.cpu_count()
+        self.pending = 0
+        self.started = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                            thread_name_prefix="bcrypt")
+
+    def _timed(self, func: Callable, args: tuple, queued_at: float):
+        """Runs a job on a pool thread, recording how long it waited.
+
+        Args:
+        - func (Callable): The blocking function.
+        - args (tuple): Its arguments.
+        - queued_at (float): Monotonic time the job was submitted.
+
+        Returns:
+        - The function's result.
+        """
+        wait = time.monotonic() - queued_at
+        with self._lock:
+            self.pending -= 1
+            self.started += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.completed += 1
+
+    def _discard_cancelled(self, future: Future) -> None:
+        """Stops counting a job as pending when it was cancelled before
+        a thread picked it up, e.g. by `asyncio.wait_for` timing out.
+
+        Args:
+        - future (Future): The future of the job.
+        """
+        if future.cancelled():
+            with self._lock:
+                self.pending -= 1
+
+    async def run(self, func: Callable, *args):
+        """Runs a function on the pool without blocking the event loop.
+
+        Args:
+        - func (Callable): The blocking function.
+        - args: Its arguments.
+
+        Returns:
+        - The function's result.
+        """
+        with self._lock:
+            self.pending += 1
+        try:
+            future = self._executor.submit(self._timed, func, args,
+                                           time.monotonic())
+        except BaseException:
+            with self._lock:
+                self.pending -= 1
+            raise
+        future.add_done_callback(self._discard_cancelled)
+        return await asyncio.wrap_future(future)
+
+    @property
+    def queue_depth(self) -> int:
+        """Returns the number of jobs waiting for a thread.
+        """
+        return self.pending
+
+    @property
+    def mean_wait(self) -> float:
+        """Returns the mean time in seconds a job waited for a thread.
+        """
+        with self._lock:
+            total_wait, started = self.total_wait, self.started
+        return total_wait / started if started else 0.0
+
+    def shutdown(self) -> None:
+        """Waits for the running jobs and stops the pool.
+        """
+        self._executor.shutdown(wait=True)
+
+
+_hashing_executor = HashingExecutor()
+
+
+async def _hash_password_async(password: str) -> bytes:
+    """Hashes a password using bcrypt without blocking the event loop.
+
+    Args:
+    - password (str): The password to hash.
+
+    Returns:
+    - bytes: The hashed password.
+    """
+    return await _hashing_executor.run(_hash_password, password)
+
+
 def _generate_uuid() -> str:
     """Generates a UUID.
 
@@ -46,6 +163,21 @@ class Auth:
         """
         self._db = DB()
 
+    def _user_exists(self, email: str) -> bool:
+        """Checks if a user is registered with an email.
+
+        Args:
+        - email (str): The email address of the user.
+
+        Returns:
+        - bool: True if the user exists, False otherwise.
+        """
+        try:
+            self._db.find_user_by(email=email)
+        except NoResultFound:
+            return False
+        return True
+
     def register_user(self, email: str, password: str) -> User:
         """Registers a new user in the database.
 
@@ -90,6 +222,55 @@ class Auth:
             return False
         return False
 
+    async def register_user_async(self, email: str, password: str) -> User:
+        """Registers a new user, hashing the password off the event loop.
+
+        Args:
+        - email (str): The email address of the user.
+        - password (str): The password of the user.
+
+        Returns:
+        - User: The newly registered user object.
+
+        Raises:
+        - ValueError: If the user with the given email already exists.
+        """
+        if self._user_exists(email):
+            raise ValueError("User {} already exists".format(email))
+        hashed_password = await _hash_password_async(password)
+        # Another registration of the email may have completed while
+        # the password was hashed.
+        if not self._user_exists(email):
+            try:
+                return self._db.add_user(email, hashed_password)
+            except Exception as e:
+                print(f"An error occurred: {e}")
+        raise ValueError("User {} already exists".format(email))
+
+    async def valid_login_async(self, email: str, password: str) -> bool:
+        """Checks if the login details are valid for a user, running the
+        bcrypt check off the event loop.
+
+        Args:
+        - email (str): The email address of the user.
+        - password (str): The password of the user.
+
+        Returns:
+        - bool: True if the login details are valid, False otherwise.
+        """
+        user = None
+        try:
+            user = self._db.find_user_by(email=email)
+        except NoResultFound:
+            return False
+        if user is None:
+            return False
+        return await _hashing_executor.run(
+            bcrypt.checkpw,
+            password.encode("utf-8"),
+            user.hashed_password,
+        )
+
     def create_session(self, email: str) -> str:
         """Creates a new session for a user.
 